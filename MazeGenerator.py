@@ -0,0 +1,395 @@
+"""MazeGenerator class."""
+
+import sys
+import random
+import argparse
+from array import array
+from MazeSolver import Grid, WALL, PATH, START, DEST
+
+ALGORITHMS = ('backtracker', 'kruskal', 'eller')
+
+# the sides of a room that open rooms are cleared around, as a range of
+# tiles; a room covers 49 tiles on average
+ROOM_SIZES = (3, 11)
+
+# translates 0/1 passage flags into wall and path characters, and the
+# generator's characters into Grid cell codes
+_LINKS = bytes.maketrans(b'\x00\x01', b'01')
+_CODES = bytes.maketrans(b'01SD', bytes([WALL, PATH, START, DEST]))
+
+
+class MazeGenerator:
+    """Generate mazes in the text format MazeSolver.get_maze() reads.
+
+    Mazes are carved on a lattice of rooms at the odd rows and columns, so
+    they have a border of wall and corridors one tile wide, with the start
+    at the top left room and the destination at the bottom right. A maze of
+    an even number of rows or columns gets an extra row or column of wall.
+
+    Every algorithm makes a perfect maze: one path between any two tiles.
+    'backtracker' (an iterative depth-first recursive backtracker) makes
+    long, winding corridors with few branches; 'kruskal' (random walls
+    knocked down with a union-find to keep out loops) makes many short
+    dead-ends; and 'eller' makes the maze one row at a time, keeping only a
+    row in memory, so very tall mazes can be streamed to disk.
+
+    braid adds loops, and rooms clears open areas, as the maze is made, so
+    they stream too.
+
+    Public methods:
+        grid(rows, cols):   Returns a maze as a Grid, for
+                            MazeSolver.set_maze().
+        lines(rows, cols):  Yields the rows of a maze as strings.
+        write(filename, rows, cols):
+                            Writes a maze to a file, a row at a time.
+
+    Instance variables:
+        algorithm:          'backtracker', 'kruskal' or 'eller'.
+        braid:              The chance that each dead-end is knocked
+                            through to a neighbouring room, making a loop.
+        rng:                The random.Random the mazes are made from.
+        rooms:              About how much of the maze is cleared into open
+                            rooms.
+    """
+
+    def __init__(self, algorithm='backtracker', braid=0.0, rooms=0.0,
+                 seed=None, source_wall='0', source_path='1',
+                 source_start='S', source_dest='D'):
+        """Construct a MazeGenerator object.
+
+        Keyword Args:
+            algorithm (str):    'backtracker', 'kruskal' or 'eller'
+            braid (float):      from 0 (a perfect maze) to 1 (no dead-ends)
+            rooms (float):      from 0 (no rooms) to 1
+            seed:               seeds rng; the same seed makes the same
+                                mazes
+            source_wall:        The wall character written out.
+            source_path:        The path character written out.
+            source_start:       The start character written out.
+            source_dest:        The destination character written out.
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError("algorithm must be one of {}".format(
+                ', '.join(ALGORITHMS)))
+        self.algorithm = algorithm
+        self.braid = braid
+        self.rooms = rooms
+        self.rng = random.Random(seed)
+        self._chars = str.maketrans({'0': source_wall, '1': source_path,
+                                     'S': source_start, 'D': source_dest})
+
+    def grid(self, rows, cols):
+        """Make a maze straight into a Grid of cell codes.
+
+        Args:
+            rows (int):     the number of rows
+            cols (int):     the number of columns
+
+        Returns:
+            maze (Grid)
+        """
+        cells = bytearray()
+        for line in self._lines(rows, cols):
+            cells += line.translate(_CODES)
+        return Grid(rows, cols, cells)
+
+    def lines(self, rows, cols):
+        """Yield the rows of a maze as strings of the source characters.
+
+        Args:
+            rows (int):     the number of rows
+            cols (int):     the number of columns
+        """
+        for line in self._lines(rows, cols):
+            yield line.decode('ascii').translate(self._chars)
+
+    def write(self, filename, rows, cols):
+        """Write a maze to a file, a row at a time.
+
+        With algorithm='eller', only a row of the maze is held in memory
+        however tall it is.
+
+        Args:
+            filename (str): name of the file to write
+            rows (int):     the number of rows
+            cols (int):     the number of columns
+        """
+        with open(filename, 'w', encoding='utf-8', newline='\n') as f:
+            for line in self.lines(rows, cols):
+                f.write(line)
+                f.write('\n')
+
+    def _lines(self, rows, cols):
+        """Yield the rows of a maze as bytearrays of '0', '1', 'S' and 'D'."""
+        lattice_rows, lattice_cols = (rows - 1) // 2, (cols - 1) // 2
+        if lattice_rows < 1 or lattice_cols < 1 or \
+                lattice_rows * lattice_cols < 2:
+            raise ValueError("a maze needs room for a start and a "
+                             "destination: at least 3x5 or 5x3 tiles")
+        lines = self._render(lattice_rows, lattice_cols, rows, cols)
+        if self.rooms:
+            lines = self._clear_rooms(lines, rows, cols)
+        return lines
+
+    def _render(self, lattice_rows, lattice_cols, rows, cols):
+        """Turn the algorithm's passages into rows of tiles.
+
+        Each row of rooms is braided as soon as the algorithm has made it,
+        and written out once the row after it is braided, which may knock
+        through the wall between them.
+        """
+        make = {'backtracker': self._backtracker, 'kruskal': self._kruskal,
+                'eller': self._eller}[self.algorithm]
+        wall = bytearray(b'0') * cols
+        yield wall
+        north = None
+        for row, (east, south) in enumerate(make(lattice_rows,
+                                                 lattice_cols)):
+            if self.braid:
+                self._braid(row, lattice_rows, north, east, south)
+            if north is not None:
+                line = bytearray(wall)
+                line[1:2*lattice_cols:2] = north.translate(_LINKS)
+                yield line
+            line = bytearray(wall)
+            line[1:2*lattice_cols:2] = b'1' * lattice_cols
+            line[2:2*lattice_cols - 1:2] = east[:-1].translate(_LINKS)
+            if row == 0:
+                line[1] = ord('S')
+            if row == lattice_rows - 1:
+                line[2*lattice_cols - 1] = ord('D')
+            yield line
+            north = south
+        for _ in range(rows - 2*lattice_rows):
+            yield bytearray(wall)
+
+    def _braid(self, row, lattice_rows, north, east, south):
+        """Knock dead-ends of a row of rooms through to a neighbour.
+
+        Args:
+            row (int):              the row of rooms
+            lattice_rows (int):     the number of rows of rooms
+            north (bytearray):      the passages south from the row above,
+                                    or None for the first row
+            east, south (bytearray):
+                                    the passages east and south from the row
+        """
+        rng = self.rng
+        braid = self.braid
+        last_col = len(east) - 1
+        last_row = row == lattice_rows - 1
+        for col in range(last_col + 1):
+            # the walls around the room that could be knocked through
+            walls = []
+            if north is not None and not north[col]:
+                walls.append((north, col))
+            if not last_row and not south[col]:
+                walls.append((south, col))
+            if col < last_col and not east[col]:
+                walls.append((east, col))
+            if col and not east[col - 1]:
+                walls.append((east, col - 1))
+            sides = 4 - (north is None) - last_row - (col == last_col) - \
+                (col == 0)
+            # a braid of 1 knocks through every dead-end without drawing
+            # for it
+            if sides - len(walls) == 1 and walls and (
+                    braid >= 1 or rng.random() < braid):
+                passages, i = rng.choice(walls)
+                passages[i] = 1
+
+    def _clear_rooms(self, lines, rows, cols):
+        """Clear open rooms in rows of tiles as they go by.
+
+        Rooms start on each row at random, as many as make them cover about
+        the rooms share of the maze, and are cleared on every row they span.
+        """
+        rng = self.rng
+        low, high = ROOM_SIZES
+        average_area = ((low + high) / 2) ** 2
+        starts = self.rooms * (cols - 2) / average_area
+        open_rooms = []
+        for i, line in enumerate(lines):
+            if 0 < i < rows - 1:
+                count = int(starts) + (rng.random() < starts % 1)
+                for _ in range(count):
+                    width = min(rng.randint(low, high), cols - 2)
+                    left = rng.randint(1, cols - 1 - width)
+                    last = min(i + rng.randint(low, high) - 1, rows - 2)
+                    open_rooms.append((last, left, left + width))
+                for last, left, right in open_rooms:
+                    line[left:right] = line[left:right].replace(b'0', b'1')
+                open_rooms = [room for room in open_rooms if room[0] > i]
+            yield line
+
+    def _backtracker(self, lattice_rows, lattice_cols):
+        """Carve a maze with an iterative recursive backtracker.
+
+        From the first room, the backtracker walks to a random neighbour it
+        has not been to, knocking down the wall between them, and backs up
+        along its trail when there is none.
+
+        Yields:
+            east, south (bytearray):    for each row of rooms, the
+                                        passages east and south of each
+                                        room
+        """
+        rng = self.rng
+        size = lattice_rows * lattice_cols
+        cols = lattice_cols
+        east = bytearray(size)
+        south = bytearray(size)
+        seen = bytearray(size)
+        i = 0
+        seen[i] = 1
+        stack = [i]
+        while stack:
+            i = stack[-1]
+            col = i % cols
+            options = []
+            if i >= cols and not seen[i - cols]:
+                options.append(i - cols)
+            if i + cols < size and not seen[i + cols]:
+                options.append(i + cols)
+            if col + 1 < cols and not seen[i + 1]:
+                options.append(i + 1)
+            if col and not seen[i - 1]:
+                options.append(i - 1)
+            if not options:
+                stack.pop()
+                continue
+            j = rng.choice(options)
+            if j == i + cols:
+                south[i] = 1
+            elif j == i - cols:
+                south[j] = 1
+            elif j == i + 1:
+                east[i] = 1
+            else:
+                east[j] = 1
+            seen[j] = 1
+            stack.append(j)
+        for start in range(0, size, cols):
+            yield east[start:start + cols], south[start:start + cols]
+
+    def _kruskal(self, lattice_rows, lattice_cols):
+        """Carve a maze by Kruskal's algorithm.
+
+        Every wall between two rooms is knocked down in a random order,
+        unless the rooms are already joined; a union-find of the rooms
+        keeps track of which are.
+
+        Yields:
+            east, south (bytearray):    as _backtracker() yields them
+        """
+        size = lattice_rows * lattice_cols
+        cols = lattice_cols
+        east = bytearray(size)
+        south = bytearray(size)
+        # wall 2*i is east of room i, and wall 2*i + 1 south of it
+        walls = [2*i for i in range(size) if i % cols + 1 < cols]
+        walls += [2*i + 1 for i in range(size - cols)]
+        self.rng.shuffle(walls)
+        parents = array('l', range(size))
+        joins = size - 1
+        for wall in walls:
+            i = wall >> 1
+            j = i + cols if wall & 1 else i + 1
+            # find both roots, halving the paths on the way
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            while parents[j] != j:
+                parents[j] = parents[parents[j]]
+                j = parents[j]
+            if i == j:
+                continue
+            parents[i] = j
+            if wall & 1:
+                south[wall >> 1] = 1
+            else:
+                east[wall >> 1] = 1
+            joins -= 1
+            if not joins:
+                break
+        for start in range(0, size, cols):
+            yield east[start:start + cols], south[start:start + cols]
+
+    def _eller(self, lattice_rows, lattice_cols):
+        """Carve a maze a row at a time by Eller's algorithm.
+
+        Each room of a row belongs to a set of the rooms it is joined to.
+        Neighbouring rooms of different sets are joined at random, and then
+        every set is joined to the row below at least once, so nothing is
+        cut off. The last row joins all its sets. Only the sets of the
+        current row are kept.
+
+        Yields:
+            east, south (bytearray):    as _backtracker() yields them; any
+                                        passages south added to a row
+                                        before the next is made carry its
+                                        sets down too
+        """
+        rng = self.rng
+        cols = lattice_cols
+        sets = list(range(cols))
+        next_set = cols
+        for row in range(lattice_rows):
+            last = row == lattice_rows - 1
+            members = {}
+            for col, room_set in enumerate(sets):
+                members.setdefault(room_set, []).append(col)
+            east = bytearray(cols)
+            for col in range(cols - 1):
+                a, b = sets[col], sets[col + 1]
+                if a != b and (last or rng.random() < 0.5):
+                    east[col] = 1
+                    # relabel the smaller set
+                    if len(members[a]) < len(members[b]):
+                        a, b = b, a
+                    for member in members[b]:
+                        sets[member] = a
+                    members[a].extend(members.pop(b))
+            south = bytearray(cols)
+            if not last:
+                for cells in members.values():
+                    down = [col for col in cells if rng.random() < 0.5]
+                    for col in down or [rng.choice(cells)]:
+                        south[col] = 1
+            yield east, south
+            # rooms with no passage from above start sets of their own
+            for col in range(cols):
+                if not south[col]:
+                    sets[col] = next_set
+                    next_set += 1
+
+
+def main(argv=None):
+    """Write a maze to a file from the command line.
+
+    Returns:
+        status (int):   the exit status
+    """
+    parser = argparse.ArgumentParser(
+        description='Generate a maze in the text format MazeSolver reads.')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('cols', type=int)
+    parser.add_argument('filename')
+    parser.add_argument('--algorithm', default='backtracker',
+                        choices=ALGORITHMS,
+                        help='(default: %(default)s)')
+    parser.add_argument('--braid', type=float, default=0.0,
+                        help='chance of knocking each dead-end through '
+                             '(default: %(default)s)')
+    parser.add_argument('--rooms', type=float, default=0.0,
+                        help='share of the maze cleared into rooms '
+                             '(default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    MazeGenerator(args.algorithm, args.braid, args.rooms,
+                  args.seed).write(args.filename, args.rows, args.cols)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
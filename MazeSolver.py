@@ -1,38 +1,857 @@
-"""MazeSolver class."""
+"""MazeSolver, Grid, SolutionCache and SolverStats classes, and the command
+line."""
 
+import io
+import os
 import sys
+import glob
+import json
+import argparse
+import mmap
+import multiprocessing
+import heapq
+import pickle
+import struct
+import hashlib
+import time
 import random
+from array import array
+from collections import deque, OrderedDict
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext, redirect_stdout
+from itertools import islice, repeat
 import networkx as nx
 
 __author__ = "Aaron Bunch"
 __date__ = "Jan 9, 2018"
 
+# Cell codes stored in a Grid. The display character for each code is found
+# by indexing the grid's chars string with the code.
+PATH = 0
+WALL = 1
+START = 2
+DEST = 3
+BLAZE = 4
+
+CHARS = ' \u2588SD\u00B7'
+
+# every code but WALL can be walked on
+OPEN_CODES = [code for code in range(256) if code != WALL]
+
+# translates the '0'/'1' digits of a bitmask into PATH/WALL cell codes, and
+# cell codes into a '1' for WALL and a '0' for anything else
+_BITS_TO_CODES = bytes.maketrans(b'01', bytes([PATH, WALL]))
+_WALL_DIGITS = bytes([49 if code == WALL else 48 for code in range(256)])
+
+# the cell codes of the eight tiles each byte of a binary maze's bitmap
+# holds, highest bit first, by byte
+_BYTE_CODES = [bytes([WALL if byte >> (7 - bit) & 1 else PATH
+                      for bit in range(8)]) for byte in range(256)]
+
+# the header of a binary maze file: magic, format version, rows and cols,
+# then the start and destination rows and cols (-1 if there is none);
+# a bitmap of the walls follows, see MazeSolver.save_maze()
+_BINARY_HEADER = struct.Struct('<4sHIIiiii')
+_BINARY_MAGIC = b'MAZE'
+_BINARY_VERSION = 1
+
+# the whitespace str.rstrip() would strip from a row, besides line endings
+_STRIPPED = b' \t\x0b\x0c\x1c\x1d\x1e\x1f'
+
+# how much of a memory-mapped maze file is translated at a time
+_LOAD_BLOCK = 2**20
+
+# flags every nonzero byte with a 1
+_NONZERO = bytes([0]) + bytes([1]) * 255
+
+# the open sides of a tile are bits of a byte, as Grid.path_sides() returns
+# them; _SIDES turns them into get_paths()'s (north, south, east, west)
+NORTH, SOUTH, EAST, WEST = 1, 2, 4, 8
+_SIDES = [(bool(sides & NORTH), bool(sides & SOUTH), bool(sides & EAST),
+           bool(sides & WEST)) for sides in range(256)]
+_DEGREE = bytes(bin(sides).count('1') for sides in range(256))
+
+# flags the sides of a tile with more than two open paths, and the tiles a
+# branch can be on
+_BRANCHING = bytes(int(degree > 2) for degree in _DEGREE)
+_WALKABLE = bytes(int(code in (PATH, START, DEST)) for code in range(256))
+
+# flags the sides of a tile with fewer than two open paths, and the tiles
+# anything but WALL can be on
+_DEAD_ENDING = bytes(int(degree < 2) for degree in _DEGREE)
+_OPEN = bytes(int(code != WALL) for code in range(256))
+
+# the walker's heading is the index of a direction in get_paths() order, so
+# the side it heads out through is 1 << heading
+_ROW_STEP = (-1, 1, 0, 0)
+_COL_STEP = (0, 0, 1, -1)
+_HEADINGS = {(-1, 0): 0, (1, 0): 1, (0, 1): 2, (0, -1): 3}
+
+# the order the walker tries the ways out of a tile: for each heading, the
+# first choice, the second choice, and the way it takes when neither is open
+_RIGHT, _LEFT = 0, 1
+_TURN_ORDERS = (((2, 0, 3), (3, 1, 2), (1, 2, 0), (0, 3, 1)),
+                ((3, 0, 2), (2, 1, 3), (0, 2, 1), (1, 3, 0)))
+# at S there is no heading yet: right tries clockwise from north, left
+# clockwise from south
+_FIRST_ORDERS = ((0, 2, 1, 3), (1, 3, 0, 2))
+
+
+def _first_open(order, sides):
+    """Return the first heading of order that is open, or else the last."""
+    for heading in order[:-1]:
+        if sides & 1 << heading:
+            return heading
+    return order[-1]
+
+
+# the next heading, at index (turn*4 + heading)*16 + open sides
+_NEXT_HEADING = bytes(_first_open(order, sides)
+                      for orders in _TURN_ORDERS for order in orders
+                      for sides in range(16))
+# the first heading, at index turn*16 + open sides
+_FIRST_HEADING = bytes(_first_open(order, sides)
+                       for order in _FIRST_ORDERS for sides in range(16))
+
+
+class _NoAttrs(dict):
+    """An attribute dict that stays empty, shared by every node of a graph."""
+
+    def __setitem__(self, key, value):
+        raise TypeError('nodes of this graph cannot have attributes')
+
+    def update(self, *args, **kwargs):
+        if dict(*args, **kwargs):
+            raise TypeError('nodes of this graph cannot have attributes')
+
+
+_NO_ATTRS = _NoAttrs()
+
+# stands in for a cache miss, as None can be a cached result
+_MISSING = object()
+
+
+class _BareGraph(nx.Graph):
+    """A networkx graph whose nodes all share one empty attribute dict.
+
+    networkx gives every node a dict of its own for attributes, which for a
+    large maze is millions of empty dicts.
+    """
+
+    # a C-level callable, so creating a node costs no Python function call
+    node_attr_dict_factory = repeat(_NO_ATTRS).__next__
+
+
+class _Tally:
+    """Counts the steps of a foray in place of a list of them.
+
+    break_loop() appends every step to its trail; when the steps themselves
+    are not wanted but their number is, a tally keeps the count without
+    keeping the steps.
+    """
+
+    __slots__ = ['count']
+
+    def __init__(self):
+        self.count = 0
+
+    def append(self, step):
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+
+class _Paths:
+    """The open sides of every tile of a maze, kept up to date as walls go in.
+
+    The walker looks up the paths at each step here instead of probing the
+    four neighbours of the tile in the maze. Only the sides of open tiles
+    are kept up to date; nothing looks up the sides of a wall.
+    """
+
+    __slots__ = ['cols', 'sides']
+
+    def __init__(self, maze):
+        self.cols = maze.cols
+        self.sides = maze.path_sides()
+
+    def wall(self, indices):
+        """Close the sides that open onto tiles that have been walled off."""
+        sides = self.sides
+        cols = self.cols
+        for i in indices:
+            open_sides = sides[i]
+            if open_sides & NORTH:
+                sides[i-cols] &= ~SOUTH
+            if open_sides & SOUTH:
+                sides[i+cols] &= ~NORTH
+            if open_sides & EAST:
+                sides[i+1] &= ~WEST
+            if open_sides & WEST:
+                sides[i-1] &= ~EAST
+
+    def num_branches(self, maze):
+        """Count the branches off the border of the maze."""
+        size = len(maze.cells)
+        flags = (int.from_bytes(self.sides.translate(_BRANCHING), 'little') &
+                 int.from_bytes(maze.cells.translate(_WALKABLE), 'little'))
+        flags = flags.to_bytes(size, 'little')
+        cols = maze.cols
+        count = 0
+        for start in range(cols, size - cols, cols):
+            count += flags.count(1, start + 1, start + cols - 1)
+        return count
+
+
+class _Degrees(dict):
+    """The number of open paths at each tile, read from a _Paths as needed.
+
+    A fill counts down the paths of the tiles next to the ones it walls off
+    here, without touching the _Paths, and never reads the rest.
+    """
+
+    __slots__ = ['sides']
+
+    def __init__(self, paths):
+        self.sides = paths.sides
+
+    def __missing__(self, i):
+        return _DEGREE[self.sides[i]]
+
+
+class Grid:
+    """A maze stored as a flat bytearray of cell codes.
+
+    The cells are stored row by row, so the cell at (row, col) lives at
+    index row*cols + col. Reading or writing a cell is a single array lookup;
+    the maze is only turned back into strings when it is rendered. Indexing
+    or iterating a grid yields its rendered rows, and a grid compares equal
+    to the list of strings it renders as.
+
+    Public methods:
+        bits(mask):             Yields the positions of the set bits of a
+                                bitmask.
+        changes(before):        Returns the flat indices of the cells that
+                                differ from another grid.
+        column_masks():         Returns bitmasks of all but the first and all
+                                but the last column.
+        copy():                 Returns an independent copy of the grid.
+        count(code):            Counts the cells holding a code.
+        find(code):             Returns the flat indices of a code.
+        from_strings(maze):     Builds a grid from a list of strings.
+        get(row, col):          Returns the code at a position.
+        index(row, col):        Returns the flat index of a position.
+        mask(codes):            Returns a bitmask of the cells holding codes.
+        pad(top, bottom, left, right):
+                                Returns a copy with borders added.
+        path_sides():           Returns the open sides of every cell.
+        set(row, col, code):    Writes a code at a position.
+        to_strings():           Renders the grid as a list of strings.
+        wall_off(mask):         Turns the path cells in a bitmask into wall.
+
+    Instance variables:
+        cells:  a bytearray with one cell code per cell
+        chars:  the display characters, indexed by cell code
+        cols:   the number of columns (the stride between rows)
+        rows:   the number of rows
+    """
+
+    def __init__(self, rows, cols, cells=None, chars=CHARS):
+        """Construct a Grid object.
+
+        Args:
+            rows (int):         the number of rows
+            cols (int):         the number of columns
+
+        Keyword Args:
+            cells (bytearray):  the cell codes (all path if omitted)
+            chars (str):        the display characters, indexed by cell code
+        """
+        self.rows = rows
+        self.cols = cols
+        if cells is None:
+            cells = bytearray(rows * cols)
+        self.cells = cells
+        self.chars = chars
+        self._render = {code: char for code, char in enumerate(chars)}
+
+    @classmethod
+    def from_strings(cls, maze, chars=CHARS, codes=None, top=0):
+        """Build a grid from a list of strings.
+
+        Short rows are padded on the right with wall, so the grid is always
+        rectangular. Any other character up to U+00FF is kept as its own
+        ordinal; one past that does not fit in a cell and is a ValueError.
+
+        Args:
+            maze:           a list of strings
+
+        Keyword Args:
+            chars (str):    the display characters, indexed by cell code
+            codes (dict):   a str.translate() table from the characters in
+                            maze to cell codes; defaults to the inverse of
+                            chars
+            top (int):      the row of the maze's first string in its source
+                            file, for the ValueError
+
+        Returns:
+            grid (Grid)
+        """
+        if codes is None:
+            codes = {ord(char): code for code, char in enumerate(chars)}
+        rows = len(maze)
+        cols = max([len(row) for row in maze], default=0)
+        cells = bytearray()
+        for row_index, row in enumerate(maze):
+            try:
+                cells += row.translate(codes).encode('latin-1')
+            except UnicodeEncodeError as e:
+                raise ValueError(
+                    "no cell code for {!r} at row {}, column {}".format(
+                        row[e.start], top + row_index, e.start)) from None
+            cells += bytes([WALL]) * (cols - len(row))
+        return cls(rows, cols, cells, chars)
+
+    def copy(self):
+        """Return an independent copy of the grid."""
+        return Grid(self.rows, self.cols, self.cells[:], self.chars)
+
+    def index(self, row, col):
+        """Return the flat index of (row, col)."""
+        return row * self.cols + col
+
+    def get(self, row, col):
+        """Return the cell code at (row, col)."""
+        return self.cells[row * self.cols + col]
+
+    def set(self, row, col, code):
+        """Write a cell code at (row, col)."""
+        self.cells[row * self.cols + col] = code
+
+    def count(self, code):
+        """Count the cells holding a code."""
+        return self.cells.count(code)
+
+    def find(self, code):
+        """Return the flat indices of the cells holding a code, in order."""
+        found = []
+        cells = self.cells
+        i = cells.find(code)
+        while i != -1:
+            found.append(i)
+            i = cells.find(code, i + 1)
+        return found
+
+    def changes(self, before):
+        """Return the flat indices of the cells that differ from a snapshot.
+
+        Args:
+            before (bytes): an earlier copy of the cells, bytes(grid.cells)
+
+        Returns:
+            changed (list): flat indices, in order
+        """
+        size = len(self.cells)
+        diff = (int.from_bytes(self.cells, 'little') ^
+                int.from_bytes(before, 'little')).to_bytes(size, 'little')
+        return Grid(self.rows, self.cols, diff.translate(_NONZERO)).find(1)
+
+    def path_sides(self):
+        """Return the open sides of every cell, one byte per cell.
+
+        A side is open when the cell across it is anything but WALL; sides
+        that step off the grid are never open. The bits of each byte are
+        NORTH, SOUTH, EAST and WEST.
+
+        Returns:
+            sides (bytearray)
+        """
+        size = len(self.cells)
+        open_cells = self.mask(OPEN_CODES)
+        not_first_col, not_last_col = self.column_masks()
+        side_masks = [(NORTH, (open_cells << self.cols) & ((1 << size) - 1)),
+                      (SOUTH, open_cells >> self.cols),
+                      (EAST, (open_cells >> 1) & not_last_col),
+                      (WEST, (open_cells << 1) & not_first_col)]
+        # the side bits never overlap, so adding them as bytes ors them
+        total = 0
+        for side, mask in side_masks:
+            digits = bin(mask)[:1:-1].ljust(size, '0').encode('ascii')
+            total += int.from_bytes(
+                digits.translate(bytes.maketrans(b'01', bytes([0, side]))),
+                'little')
+        return bytearray(total.to_bytes(size, 'little'))
+
+    def mask(self, codes):
+        """Return a bitmask of the cells holding any of the given codes.
+
+        Bit i of the mask is set when cell i holds one of the codes. Masks are
+        Python ints, so whole-maze operations on them (shifts, ands, ors) run
+        in C rather than cell by cell.
+
+        Args:
+            codes:  a collection of cell codes
+
+        Returns:
+            mask (int)
+        """
+        if not self.cells:
+            return 0
+        table = bytes([49 if code in codes else 48 for code in range(256)])
+        return int(self.cells.translate(table)[::-1], 2)
+
+    @staticmethod
+    def bits(mask):
+        """Yield the positions of the set bits of a bitmask, lowest first."""
+        digits = bin(mask)[:1:-1]
+        i = digits.find('1')
+        while i != -1:
+            yield i
+            i = digits.find('1', i + 1)
+
+    def column_masks(self):
+        """Return bitmasks of all but the first and all but the last column.
+
+        Shifting a mask by one moves cells east or west, but the cells in the
+        edge columns wrap around onto the next or previous row. Anding with
+        these masks drops them.
+
+        Returns:
+            not_first_col (int), not_last_col (int)
+        """
+        if not self.cols:
+            return 0, 0
+        not_first_col = int((('0' + '1'*(self.cols-1)) * self.rows)[::-1], 2)
+        not_last_col = int((('1'*(self.cols-1) + '0') * self.rows)[::-1], 2)
+        return not_first_col, not_last_col
+
+    def wall_off(self, mask):
+        """Turn every path cell flagged in a bitmask into wall.
+
+        Every cell flagged in the mask must hold PATH.
+
+        Args:
+            mask (int): a bitmask as returned by mask()
+        """
+        size = len(self.cells)
+        bits = bin(mask)[:1:-1].ljust(size, '0')
+        step = bits.encode('ascii').translate(_BITS_TO_CODES)
+        # PATH is 0 and WALL is 1, so adding the flagged cells as bytes walls
+        # them off without any carries between cells
+        total = (int.from_bytes(self.cells, 'little') +
+                 int.from_bytes(step, 'little'))
+        self.cells[:] = total.to_bytes(size, 'little')
+
+    def pad(self, top=0, bottom=0, left=0, right=0, code=WALL):
+        """Return a copy of the grid with borders of a cell code added.
+
+        Keyword Args:
+            top, bottom (int):  the number of rows to add
+            left, right (int):  the number of columns to add
+            code (int):         the cell code of the border
+
+        Returns:
+            grid (Grid)
+        """
+        cols = self.cols + left + right
+        fill = bytes([code])
+        cells = bytearray(fill * (top * cols))
+        for row in range(self.rows):
+            start = row * self.cols
+            cells += fill * left
+            cells += self.cells[start:start + self.cols]
+            cells += fill * right
+        cells += fill * (bottom * cols)
+        return Grid(self.rows + top + bottom, cols, cells, self.chars)
+
+    def to_strings(self):
+        """Render the grid as a list of strings."""
+        return [self[row] for row in range(self.rows)]
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError('grid row out of range')
+        start = row * self.cols
+        return (self.cells[start:start + self.cols].decode('latin-1')
+                .translate(self._render))
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+    def __eq__(self, other):
+        if isinstance(other, Grid):
+            return ((self.rows, self.cols, self.cells) ==
+                    (other.rows, other.cols, other.cells))
+        if isinstance(other, (list, tuple)):
+            return self.to_strings() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __str__(self):
+        return '\n'.join(self)
+
+
+class SolutionCache:
+    """A cache of solutions and graphs, by the maze and how it is solved.
+
+    Entries are keyed by a hash of the maze's cell codes, so the same maze
+    hits the same entries however its source file is laid out or what its
+    source characters are. A MazeSolver whose cache attribute is set to a
+    SolutionCache looks its results up there before working them out.
+
+    The most recently used entries are kept in memory. With a directory,
+    every entry is also pickled to a file there, so the cache outlasts the
+    process and can be shared between processes. When the files take up
+    more than max_disk_bytes, the least recently used are deleted. The
+    total is kept up to date as entries are written, and the directory is
+    only scanned when the total goes over, so most writes cost the same
+    however many entries there are.
+
+    Public methods:
+        clear():            Empties the cache, on disk as well.
+        get(key):           Returns a cached entry.
+        put(key, value):    Caches an entry.
+
+    Instance variables:
+        directory:          Where entries are kept on disk (None to keep
+                            them in memory only).
+        graphs:             Whether to_graph() caches its graphs.
+        max_disk_bytes:     The most the files on disk may take up.
+        max_entries:        The most entries kept in memory.
+    """
+
+    def __init__(self, directory=None, max_entries=32,
+                 max_disk_bytes=2**30, graphs=False):
+        """Construct a SolutionCache object.
+
+        Keyword Args:
+            directory (str):        where to keep entries on disk; it is
+                                    created if need be
+            max_entries (int):      the most entries to keep in memory
+            max_disk_bytes (int):   the most the files on disk may take up
+            graphs (bool):          cache the graphs to_graph() builds too;
+                                    they are large, and shared by every
+                                    solver that gets them from the cache
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.graphs = graphs
+        self._memory = OrderedDict()
+        # the bytes the files on disk take up, as far as this cache knows;
+        # None until the directory is first scanned
+        self._disk_bytes = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key, default=None):
+        """Return the entry for a key, or default if there is none.
+
+        Args:
+            key (str):  a hex digest, as MazeSolver makes them
+
+        Keyword Args:
+            default:    returned on a miss
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory is None:
+            return default
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                value = pickle.load(f)
+            # the modification time orders the files for eviction
+            os.utime(filename)
+        except FileNotFoundError:
+            return default
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # a damaged or half-written file is a miss
+            return default
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """Cache an entry under a key.
+
+        Args:
+            key (str):  a hex digest, as MazeSolver makes them
+            value:      anything that can be pickled
+        """
+        self._remember(key, value)
+        if self.directory is None:
+            return
+        filename = self._filename(key)
+        # write to a temporary file and move it into place, so other
+        # processes never read half an entry
+        temporary = '{}.{}.tmp'.format(filename, os.getpid())
+        try:
+            with open(temporary, 'wb') as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            try:
+                size -= os.stat(filename).st_size
+            except FileNotFoundError:
+                pass
+            os.replace(temporary, filename)
+        except BaseException:
+            # a value that cannot be pickled, or a full disk, leaves no
+            # temporary file behind
+            try:
+                os.remove(temporary)
+            except FileNotFoundError:
+                pass
+            raise
+        if self._disk_bytes is not None:
+            self._disk_bytes += size
+        if self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes:
+            self._evict(filename)
+
+    def clear(self):
+        """Empty the cache, on disk as well as in memory."""
+        self._memory.clear()
+        if self.directory is None:
+            return
+        for entry in self._entries():
+            os.remove(entry.path)
+        self._disk_bytes = 0
+
+    def _remember(self, key, value):
+        """Keep an entry in memory, dropping the least recently used."""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _filename(self, key):
+        """Return the name of the file an entry is kept in."""
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _entries(self):
+        """Return the directory entries of the cached files."""
+        return [entry for entry in os.scandir(self.directory)
+                if entry.name.endswith('.pickle') and entry.is_file()]
+
+    def _evict(self, keep):
+        """Delete the least recently used files until they fit on disk.
+
+        The directory is scanned afresh, which also takes in the files
+        other processes have written since. Once over max_disk_bytes, files
+        are deleted down to nine tenths of it, so the directory is not
+        scanned again until a tenth of it has been written.
+
+        Args:
+            keep (str): the name of the file just written, which is kept
+        """
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum([size for _, size, _ in entries])
+        limit = self.max_disk_bytes
+        if total > limit:
+            limit = limit * 9 // 10
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+
+class SolverStats:
+    """Timers and counters of where solve_maze() spends its time.
+
+    A MazeSolver whose stats attribute is set to a SolverStats records in it
+    the time spent in each phase of solving, and counts what the walker
+    does; with stats None (the default) nothing is recorded. Timings are
+    wall-clock seconds. Attempts made in worker processes are recorded there
+    and added in as they come back.
+
+    Phases timed:
+        solve_maze:         the whole of solve_maze() calls
+        fill_in_dead_ends:  filling in dead-ends
+        break_loop:         the walker's forays
+        num_branches:       counting the branches left after each foray
+        blaze_trail:        marking solutions on the original maze
+
+    Counters:
+        forays:             forays into the maze to break a loop
+        steps:              steps taken by the walker on those forays
+        loops_broken:       forays that broke a loop
+        branch_scans:       counts of the branches left
+        path_lookups:       open sides looked up by the walker
+        fill_passes:        fill_in_dead_ends() calls
+        cells_filled:       tiles walled off by fill_in_dead_ends()
+
+    Public methods:
+        add(phase, seconds):    Adds time spent in a phase.
+        clear():                Forgets everything recorded.
+        count(counter, n=1):    Adds to a counter.
+        merge(other):           Adds in what another SolverStats recorded.
+        to_dict():              Returns everything recorded as plain dicts
+                                and lists, ready for json.dump().
+
+    Instance variables:
+        attempts:   a dict for each solve_maze() attempt, in the order they
+                    were made, of its seconds and what it added to each
+                    counter
+        counters:   the counts, by counter
+        timers:     the seconds, by phase
+    """
+
+    PHASES = ('solve_maze', 'fill_in_dead_ends', 'break_loop', 'num_branches',
+              'blaze_trail')
+    COUNTERS = ('forays', 'steps', 'loops_broken', 'branch_scans',
+                'path_lookups', 'fill_passes', 'cells_filled')
+
+    def __init__(self):
+        """Construct a SolverStats object with nothing recorded."""
+        self.clear()
+
+    def clear(self):
+        """Forget everything recorded."""
+        self.timers = dict.fromkeys(self.PHASES, 0.0)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.attempts = []
+        self._started = None
+
+    def add(self, phase, seconds):
+        """Add time spent in a phase.
+
+        Args:
+            phase (str):        the phase
+            seconds (float):    the time spent in it
+        """
+        self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+
+    def count(self, counter, n=1):
+        """Add to a counter.
+
+        Args:
+            counter (str):  the counter
+
+        Keyword Args:
+            n (int):        how much to add
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def merge(self, other):
+        """Add in what another SolverStats recorded.
+
+        Args:
+            other (SolverStats)
+        """
+        for phase, seconds in other.timers.items():
+            self.add(phase, seconds)
+        for counter, n in other.counters.items():
+            self.count(counter, n)
+        self.attempts.extend(dict(attempt) for attempt in other.attempts)
+
+    def to_dict(self):
+        """Return everything recorded as plain dicts and lists.
+
+        Returns:
+            stats (dict):   {'timers': ..., 'counters': ..., 'attempts': ...}
+        """
+        return {'timers': dict(self.timers),
+                'counters': dict(self.counters),
+                'attempts': [dict(attempt) for attempt in self.attempts]}
+
+    def _start_attempt(self):
+        """Mark the start of a solve_maze() attempt."""
+        self._started = (time.perf_counter(), dict(self.counters))
+
+    def _end_attempt(self):
+        """Record what the attempt since _start_attempt() did."""
+        start, before = self._started
+        attempt = {'seconds': time.perf_counter() - start}
+        for counter, n in self.counters.items():
+            attempt[counter] = n - before.get(counter, 0)
+        self.attempts.append(attempt)
+        self._started = None
+
+
 class MazeSolver:
     """Find the shortest path through a maze.
 
     Public methods:
+        convert_maze(filename, binary_filename):
+                            Converts a text maze file to the binary format.
         get_forays(n):      For a given solution at index, n, prints the steps
                             of each foray into the maze to break the loops.
                             Includes the forays of failed solution attempts.
         get_maze(filename): Loads a maze from filename and converts the
                             source characters to local characters.
+        iter_forays(n):     Like get_forays(), but yields the marked mazes one
+                            at a time.
+        load_maze(filename):
+                            Loads a maze saved with save_maze().
+        nearest():          Returns a shortest path from any start to the
+                            nearest destination.
+        query(src, dst):    Returns a shortest path between any two tiles.
+        query_many(pairs):  Returns a shortest path for each (src, dst) pair.
+        save_maze(filename):
+                            Saves the loaded maze in a bit-packed binary
+                            format.
+        set_maze(maze):     Makes a Grid the loaded maze.
         solve_graph():      Use with to_graph(). Uses networkx to return the
                             shortest path from start to destination marked on
-                            the original maze. 
+                            the original maze. Without a graph, it falls back
+                            to solve_grid().
+        solve_grid():       Searches the maze directly, without networkx, and
+                            returns the shortest path from start to
+                            destination marked on the original maze.
         solve_maze(n=50):   Solve the maze n times and return the shortest path 
                             marked on the original maze.
+        solve_tiled(filename):
+                            Solves a maze file too large to load, a band of
+                            tiles at a time, and writes out the solution.
         to_graph():         Converts the loaded maze to a networkx graph.
         verify_maze():      Verifies that the maze is in the correct form.
 
     Instance variables:
         breaks:             A nested list of the broken loops for each
-                            solution. See solve_maze() for the structure.
+                            solution, kept as the tiles each foray walls
+                            off. See solve_maze() for the structure.
                             Includes the broken loops of failed attempts.
-        G:                  The original maze represented as a networkx graph.
+        cache:              A SolutionCache that solve_grid(), solve_graph()
+                            and to_graph() look their results up in (None
+                            by default).
+        explored:           The number of tiles the last solve_grid() search
+                            reached.
+        G:                  The original maze represented as a networkx graph
+                            (None until to_graph() is called).
         original_maze:      The maze as it was loaded from its source file
-                            (a list of strings).
+                            (a Grid).
+        query_cache_bytes:  The most memory query() keeps search trees in
+                            (64 MiB by default).
+        rng:                The source of the walker's random turns; the
+                            random module until solve_maze() gives each
+                            attempt a seeded random.Random of its own.
+        seed:               The master seed of the last solve_maze() run.
         shortest_solution:  The solution with the shortest path (failed
                             attempts are omitted).
+        stats:              A SolverStats that solve_maze() records its
+                            timings and counts in (None by default).
         solutions:          A list of solutions to the maze (failed attempts
                             are omitted).
         solution_lengths:   A list of the path-lengths of the solutions
@@ -61,6 +880,42 @@ class MazeSolver:
         self.source_path = source_path
         self.source_start = source_start
         self.source_dest = source_dest
+        self.G = None
+        self.rng = random
+        self.query_cache_bytes = 64 * 2**20
+        self.cache = None
+        self.stats = None
+        # set in worker processes; see _stopped()
+        self._stop = None
+        # breadth-first search trees of the maze by source tile, least
+        # recently used first
+        self._trees = OrderedDict()
+        self._trees_bytes = 0
+        # the _maze_hash() of the maze the trees were searched on
+        self._trees_maze = None
+
+    def _chars(self):
+        """Return the display characters, indexed by cell code."""
+        return self.path + self.wall + self.start + self.dest + self.blaze
+
+    def _code(self, char):
+        """Return the cell code for a display character.
+
+        Any other character is kept as its own ordinal, as get_maze() keeps
+        the characters of a file it does not know; one that does not fit in
+        a cell is a ValueError.
+        """
+        chars = self._chars()
+        if char in chars:
+            return chars.index(char)
+        if len(char) != 1 or ord(char) > 0xff:
+            raise ValueError("no cell code for {!r}".format(char))
+        return ord(char)
+
+    def _source_codes(self):
+        """Return the cell codes of the source characters, by ordinal."""
+        return {ord(self.source_wall): WALL, ord(self.source_path): PATH,
+                ord(self.source_start): START, ord(self.source_dest): DEST}
 
     def get_maze(self, filename, return_maze=False):
         """Load the maze and convert to internal wall and path characters.
@@ -69,15 +924,126 @@ class MazeSolver:
             filename (str): name of source file
 
         Returns:
-            maze (list):    source file characters converted to local
+            maze (Grid):    source file characters converted to local
                             characters
         """
-        with open(filename) as f:
-            maze = f.readlines()
-        maze = [row.rstrip() for row in maze]
-        maze = [row.replace(self.source_wall, self.wall) for row in maze]
-        maze = [row.replace(self.source_path, self.path) for row in maze]
+        codes = self._source_codes()
+        maze = self._load_plain(filename, codes)
+        if maze is None:
+            with open(filename) as f:
+                maze = [row.rstrip() for row in f]
+            # remember ragged rows for verify_maze(); the grid pads them out
+            self._ragged = len(set([len(row) for row in maze])) > 1
+            maze = Grid.from_strings(maze, self._chars(), codes)
+        else:
+            self._ragged = False
+        self._use_maze(maze)
+        if return_maze == True:
+            return maze
+
+    def load_maze(self, filename, return_maze=False):
+        """Load a maze saved with save_maze().
+
+        The wall bitmap is expanded to one cell code per tile in a single
+        pass in C. The maze is then used just as one loaded with get_maze().
+
+        Args:
+            filename (str): name of a binary maze file
+
+        Returns:
+            maze (Grid):    the maze, with its start and destination marked
+        """
+        with open(filename, 'rb') as f:
+            header = f.read(_BINARY_HEADER.size)
+            bitmap = f.read()
+        if (len(header) < _BINARY_HEADER.size or
+                header[:4] != _BINARY_MAGIC):
+            raise ValueError("not a binary maze file: {}".format(filename))
+        (_, version, rows, cols,
+         S_row, S_col, D_row, D_col) = _BINARY_HEADER.unpack(header)
+        if version != _BINARY_VERSION:
+            raise ValueError(
+                "unsupported binary maze version {}".format(version))
+        size = rows * cols
+        if len(bitmap) != (size + 7) // 8:
+            raise ValueError("truncated binary maze file: {}".format(filename))
+        # each byte of the bitmap unpacks to the codes of its eight tiles,
+        # a block of bytes at a time so only one block's pieces are held
+        cells = bytearray(len(bitmap) * 8)
+        block = _LOAD_BLOCK // 8
+        for start in range(0, len(bitmap), block):
+            chunk = bitmap[start:start + block]
+            cells[start * 8:(start + len(chunk)) * 8] = b''.join(
+                map(_BYTE_CODES.__getitem__, chunk))
+        del cells[size:]
+        maze = Grid(rows, cols, cells, self._chars())
+        if S_row >= 0:
+            maze.set(S_row, S_col, START)
+        if D_row >= 0:
+            maze.set(D_row, D_col, DEST)
+        self._ragged = False
+        self._use_maze(maze)
+        if return_maze == True:
+            return maze
+
+    def save_maze(self, filename):
+        """Save the loaded maze in the binary maze format.
+
+        The file is a header with the format version, the dimensions and the
+        start and destination, followed by one bit per tile, set for walls,
+        row by row with the highest bit of each byte first and the last byte
+        padded with zeros. That takes an eighth of a byte per tile, where the
+        text format takes a byte. Only walls, paths and the first start and
+        destination are kept; any other tile is saved as path.
+
+        Args:
+            filename (str): name of the file to write
+        """
+        maze = self.original_maze
+        ends = []
+        for code in (START, DEST):
+            i = maze.cells.find(code)
+            ends += divmod(i, maze.cols) if i != -1 else (-1, -1)
+        header = _BINARY_HEADER.pack(_BINARY_MAGIC, _BINARY_VERSION,
+                                     maze.rows, maze.cols, *ends)
+        size = len(maze.cells)
+        digits = maze.cells.translate(_WALL_DIGITS) + b'0' * (-size % 8)
+        # a leading 1 keeps the leading zeros, as a byte that is dropped
+        bitmap = int(b'1' + digits, 2).to_bytes(len(digits) // 8 + 1,
+                                                'big')[1:]
+        with open(filename, 'wb') as f:
+            f.write(header)
+            f.write(bitmap)
+
+    def convert_maze(self, filename, binary_filename):
+        """Convert a text maze file to the binary maze format.
+
+        The maze is loaded with get_maze(), so it becomes the loaded maze.
+
+        Args:
+            filename (str):         name of source file
+            binary_filename (str):  name of the binary file to write
+        """
+        self.get_maze(filename)
+        self.save_maze(binary_filename)
+
+    def set_maze(self, maze):
+        """Make a Grid the loaded maze, as if get_maze() had loaded it.
+
+        For mazes made in memory, such as by MazeGenerator.grid(). The grid's
+        cells are shared, not copied.
+
+        Args:
+            maze (Grid):    a grid of cell codes
+        """
+        self._ragged = False
+        self._use_maze(Grid(maze.rows, maze.cols, maze.cells, self._chars()))
+
+    def _use_maze(self, maze):
+        """Make a newly loaded maze the one to solve."""
         self.original_maze = maze
+        # a graph of a previously loaded maze no longer applies
+        self.G = None
 
         #######################################################################
         # Provisionally get the unverified start and destination positions so
@@ -86,49 +1052,208 @@ class MazeSolver:
         # verification.
         #######################################################################
 
-        self.S_row, self.S_col = self.find_char(self.original_maze, 'S')
-        self.D_row, self.D_col = self.find_char(self.original_maze, 'D')
+        self.S_row, self.S_col = self.find_char(self.original_maze, self.start)
+        self.D_row, self.D_col = self.find_char(self.original_maze, self.dest)
         # find_char() returns a list; we want only the first element for S and D
         if self.S_row and self.D_row:
             self.S_row = self.S_row[0]
             self.S_col = self.S_col[0]
             self.D_row = self.D_row[0]
             self.D_col = self.D_col[0]
-        if return_maze == True:
-            return maze
 
-    def to_graph(self, return_graph=False):
+    def _load_plain(self, filename, codes):
+        """Load a plain maze file straight into a Grid.
+
+        Most maze files are ASCII, with rows of equal length and nothing
+        after the last character of a row but the line ending. The file is
+        memory-mapped, the line endings are checked to fall at the end of
+        every row, and then the map is translated a block of rows at a time
+        straight into the grid's cells. Translating turns the characters into
+        cell codes and deletes the line endings, along with any whitespace
+        rstrip() would take off a row or line ending out of place; a block
+        that comes out short had one, and the file is not plain.
+
+        Args:
+            filename (str): name of source file
+            codes (dict):   the source characters' cell codes, by ordinal
+
+        Returns:
+            maze (Grid):    the maze, as get_maze() would load it
+            None:           if the file is not plain; get_maze() reads it row
+                            by row instead
+        """
+        if max(codes) > 0x7f:
+            return None
+        table = bytearray(range(256))
+        for char, code in codes.items():
+            table[char] = code
+        deleted = b'\r\n' + _STRIPPED
+        with open(filename, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                size = len(data)
+                end = data.find(b'\n')
+                if end == -1:
+                    # one row and no line ending
+                    rows, cols, eol = 1, size, b''
+                    stride = size
+                else:
+                    eol = b'\r\n' if end and data[end - 1] == 13 else b'\n'
+                    cols = end + 1 - len(eol)
+                    stride = cols + len(eol)
+                    # every row must end at the same column, so there is a
+                    # line ending every stride bytes, and after the last one
+                    # either nothing or a last row without one
+                    endings = len(range(end, size, stride))
+                    last_row = size - (end + 1 + (endings - 1) * stride)
+                    if (last_row not in (0, cols) or
+                            data[end::stride] != b'\n' * endings):
+                        return None
+                    if (eol == b'\r\n' and
+                            data[end-1::stride] != b'\r' * endings):
+                        return None
+                    rows = endings + (last_row > 0)
+                cells = bytearray(rows * cols)
+                block = max(_LOAD_BLOCK // stride, 1) * stride
+                done = 0
+                for start in range(0, size, block):
+                    chunk = data[start:start + block]
+                    # the rows of the block, less their line endings
+                    length = len(chunk) - len(chunk) // stride * len(eol)
+                    chunk = chunk.translate(table, deleted)
+                    # non-ASCII bytes are left as they are by the table
+                    if len(chunk) != length or not chunk.isascii():
+                        return None
+                    cells[done:done + length] = chunk
+                    done += length
+        return Grid(rows, cols, cells, self._chars())
+
+    def to_graph(self, return_graph=False, node_attrs=True, contract=False):
         """Converts the maze to a networkx graph.
 
+        The open tile pairs are found for the whole maze at once from bitmasks
+        (see Grid.mask()), and all the edges are handed to networkx in a
+        single add_edges_from() call.
+
+        With contract=True, only the branches, dead-ends, start and
+        destination become nodes, and each corridor between them becomes a
+        single edge. The edge's 'weight' is the number of steps along the
+        corridor, and its 'cells' are the corridor tiles, in order from the
+        lesser of its two nodes. Most tiles of a maze lie in corridors, so the
+        contracted graph is much smaller. solve_graph() expands the corridors
+        back into tiles.
+
         Keyword Args:
             return_graph (bool):    returns a networkx graph
+            node_attrs (bool):      if False, the nodes share one empty
+                                    attribute dict instead of each getting
+                                    its own, and cannot be given attributes
+            contract (bool):        contracts corridors into weighted edges
 
         Returns:
             G:      the maze represented as a networkx graph
         """
-        maze = self.original_maze[:]
-        self.G = nx.Graph()
-        for row in range(len(maze)):
-            for col in range(len(maze[row])):
-                if maze[row][col] in [self.path, self.start, self.dest]:
-                    self.G.add_node((row, col))
-                    paths = self.get_paths(maze, row, col)
-                    if paths[0]:
-                        # path north
-                        self.G.add_edge((row, col), (row-1, col))
-                    if paths[1]:
-                        # path south
-                        self.G.add_edge((row, col), (row+1, col))
-                    if paths[2]:
-                        # path east
-                        self.G.add_edge((row, col), (row, col+1))
-                    if paths[3]:
-                        # path west
-                        self.G.add_edge((row, col), (row, col-1))
+        build = self._contracted_graph if contract else self._tile_graph
+        self.G = self._cached(('to_graph', node_attrs, contract),
+                              lambda: build(node_attrs), graph=True)
         if return_graph:
             return self.G
 
-    def verify_maze(self, return_maze=False):
+    def _tile_graph(self, node_attrs):
+        """Build a graph with each open tile of the maze as a node."""
+        maze = self.original_maze
+        cols = maze.cols
+        is_open = maze.mask(OPEN_CODES)
+        nodes = maze.mask([PATH, START, DEST])
+        not_last_col = maze.column_masks()[1]
+        # bit i is set if tile i and the tile south (east) of it are open, and
+        # at least one of them is a path, start or destination tile
+        south = is_open & (is_open >> cols) & (nodes | (nodes >> cols))
+        east = (is_open & (is_open >> 1) & not_last_col &
+                (nodes | (nodes >> 1)))
+
+        # add each tile's south edge before its east edge, so every node's
+        # neighbours are in the order north, west, south, east; key 2*i is
+        # the south edge of tile i, and key 2*i + 1 its east edge
+        keys = sorted([2*i for i in Grid.bits(south)] +
+                      [2*i + 1 for i in Grid.bits(east)])
+        # only open tiles are ever nodes, so only they get a (row, col) label
+        labels = [None] * len(maze.cells)
+        for i in Grid.bits(is_open):
+            labels[i] = divmod(i, cols)
+        steps = (cols, 1)
+        edges = [(labels[k >> 1], labels[(k >> 1) + steps[k & 1]])
+                 for k in keys]
+
+        G = nx.Graph() if node_attrs else _BareGraph()
+        G.add_nodes_from([labels[i] for i in Grid.bits(nodes)])
+        G.add_edges_from(edges)
+        return G
+
+    def _contracted_graph(self, node_attrs):
+        """Build a graph with each corridor of the maze as a weighted edge.
+
+        See to_graph().
+
+        Args:
+            node_attrs (bool):  see to_graph()
+
+        Returns:
+            G:      the contracted graph
+        """
+        maze = self.original_maze
+        cells = maze.cells
+        cols = maze.cols
+        size = len(cells)
+        degrees = self._degrees(maze)
+        G = nx.Graph() if node_attrs else _BareGraph()
+        G.graph['contracted'] = True
+
+        def neighbours(i):
+            col = i % cols
+            for j in (i-cols, i+cols,
+                      i+1 if col+1 < cols else -1,
+                      i-1 if col else -1):
+                if 0 <= j < size and cells[j] != WALL:
+                    yield j
+
+        # every open tile that is not in the middle of a corridor is a node
+        nodes = [i for i in range(size)
+                 if cells[i] != WALL and
+                 (degrees[i] != 2 or cells[i] in (START, DEST))]
+        is_node = bytearray(size)
+        for i in nodes:
+            is_node[i] = 1
+            G.add_node(divmod(i, cols))
+
+        walked = bytearray(size)
+        for u in nodes:
+            for j in neighbours(u):
+                if walked[j]:
+                    continue
+                # follow the corridor until it reaches another node
+                corridor = []
+                prev = u
+                while not is_node[j]:
+                    walked[j] = 1
+                    corridor.append(j)
+                    prev, j = j, [k for k in neighbours(j) if k != prev][0]
+                if j == u:
+                    # a loop back to the same node is never on a shortest path
+                    continue
+                a, b = divmod(u, cols), divmod(j, cols)
+                if a > b:
+                    a, b = b, a
+                    corridor.reverse()
+                weight = len(corridor) + 1
+                if G.has_edge(a, b) and G[a][b]['weight'] <= weight:
+                    continue
+                G.add_edge(a, b, weight=weight,
+                           cells=[divmod(k, cols) for k in corridor])
+        return G
+
+    def verify_maze(self, return_maze=False, multiple=False):
         """Verify that the loaded maze has the correct form.
 
         The maze must have exactly one start and one destination character; it
@@ -136,15 +1261,18 @@ class MazeSolver:
         missing, one is silently added. Prints a message and returns nothing if
         there is a problem.
 
+        With multiple=True, the maze may have several starts and destinations,
+        for nearest(); S_row, S_col, D_row and D_col are the first of each.
+
         Returns:
-            maze (list):    with border walls added, if necessary
+            maze (Grid):    with border walls added, if necessary
             None:           if the maze is in the wrong form
         """
         # get start and destination positions
-        self.S_row, self.S_col = self.find_char(self.original_maze, 'S')
-        self.D_row, self.D_col = self.find_char(self.original_maze, 'D')
+        self.S_row, self.S_col = self.find_char(self.original_maze, self.start)
+        self.D_row, self.D_col = self.find_char(self.original_maze, self.dest)
         # check for multiple starts or destinations
-        if (len(self.S_row) > 1) or (len(self.D_row) > 1):
+        if not multiple and ((len(self.S_row) > 1) or (len(self.D_row) > 1)):
             if not return_maze:
                 print("""
                         The maze may contain only one start,
@@ -166,10 +1294,7 @@ class MazeSolver:
         self.D_row = self.D_row[0]
         self.D_col = self.D_col[0]
         # check for rectangularity
-        row_lengths = []
-        for row in self.original_maze:
-            row_lengths.append(len(row))
-        if len(set(row_lengths)) > 1:
+        if self._ragged:
             if not return_maze:
                 print("""
                         The maze must have rows of equal length.
@@ -177,20 +1302,24 @@ class MazeSolver:
             return
 
         # check for border walls; insert them as necessary
-        # check top wall
-        if len(set(self.original_maze[0])) > 1:
-            self.original_maze.insert(0,
-                    self.wall*(len(self.original_maze[0])))
+        maze = self.original_maze
+        # check top wall; a row added at the top moves S and D down
+        if len(set(maze.cells[:maze.cols])) > 1:
+            maze = maze.pad(top=1)
+            self.S_row += 1
+            self.D_row += 1
         # check bottom wall
-        if len(set(self.original_maze[-1])) > 1:
-            self.original_maze.append(
-                    self.wall*(len(self.original_maze[-1])))
-        # check left wall
-        if len(set([row[0] for row in self.original_maze])) > 1:
-            self.original_maze = [self.wall+row for row in self.original_maze]
+        if len(set(maze.cells[-maze.cols:])) > 1:
+            maze = maze.pad(bottom=1)
+        # check left wall; a column added at the left moves S and D right
+        if len(set(maze.cells[::maze.cols])) > 1:
+            maze = maze.pad(left=1)
+            self.S_col += 1
+            self.D_col += 1
         # check right wall
-        if len(set([row[-1] for row in self.original_maze])) > 1:
-            self.original_maze = [row+self.wall for row in self.original_maze]
+        if len(set(maze.cells[maze.cols-1::maze.cols])) > 1:
+            maze = maze.pad(right=1)
+        self.original_maze = maze
 
         if return_maze == True:
             return self.original_maze
@@ -199,7 +1328,7 @@ class MazeSolver:
         """Find a given character in the maze.
 
         Args:
-            maze:   a list of strings
+            maze:   a Grid
             char:   the character to find
 
         Returns:
@@ -208,29 +1337,23 @@ class MazeSolver:
         """
         char_row = []
         char_col = []
-        for row in range(0, len(maze)):
-            for col in range(0, len(maze[row])):
-                if maze[row][col] == char:
-                    char_row.append(row)
-                    char_col.append(col)
+        for i in maze.find(self._code(char)):
+            row, col = divmod(i, maze.cols)
+            char_row.append(row)
+            char_col.append(col)
         return char_row, char_col
 
     def count_char(self, maze, char):
         """Count the number of a given character in the maze.
 
         Args:
-            maze:   a list of strings
+            maze:   a Grid
             char:   the character to count
 
         Returns:
             count (int)
         """
-        count = 0
-        for row in range(0, len(maze)):
-            for col in range(0, len(maze[row])):
-                if maze[row][col] == char:
-                    count += 1
-        return count
+        return maze.count(self._code(char))
 
     def num_branches(self, maze):
         """Count the number of path branches in the maze.
@@ -238,44 +1361,37 @@ class MazeSolver:
         A branch is any path location with open paths on at least three sides.
 
         Args:
-            maze:           a list of strings
+            maze:           a Grid
 
         Returns:
             count (int):    the number of branches in the maze
         """
-        count = 0
-        for row in range(1, len(maze)-1):
-            for col in range(1, len(maze[row])-1):
-                if self.is_branch(maze, row, col):
-                    count += 1
-        return count
+        return _Paths(maze).num_branches(maze)
 
     def insert_char(self, maze, row, col, char):
         """Insert a character into a maze at a specified row and column.
 
+        The maze is changed in place; only the one cell is written.
+
         Args:
-            maze:           a list of strings
+            maze:           a Grid
             row (int):      the row index
             col (int):      the column index
             char:           character to insert
 
         Returns:
-            maze (list):    the maze with the character inserted
+            maze (Grid):    the maze with the character inserted
         """
-        temp_list = list(maze[row])
-        temp_list[col] = char
-        maze[row] = ''.join(temp_list)
+        maze.set(row, col, self._code(char))
         return maze
 
     def get_paths(self, maze, row, col):
         """Find the open paths at a position in a maze.
 
         Paths that step off the border of the maze are not open.
-        (The way this is implemented now, the maze can probably have a ragged
-        right edge. But that still needs to be tested.)
 
         Args:
-            maze:           a list of strings
+            maze:           a Grid
             row (int):      the row index
             col (int):      the column index
 
@@ -283,38 +1399,16 @@ class MazeSolver:
             path_north, path_south, path_east, path_west (boolean)
         """
 
-        path_north = False
-        path_south = False
-        path_east = False
-        path_west = False
-
-        try:
-            if maze[row+1][col] != self.wall:
-                path_south = True
-        except IndexError:
-            pass
-        try:
-            if maze[row][col+1] != self.wall:
-                path_east = True
-        except IndexError:
-            pass
-
-        ######################################################################
-        # We have to handle row[0] and col[0] differently, because row[-1] and
-        # col[-1] will not raise an IndexError (they point to the end of the
-        # list)
-        ######################################################################
+        cells = maze.cells
+        cols = maze.cols
+        i = row*cols + col
 
-        try:
-            if (row != 0) and (maze[row-1][col] != self.wall):
-                path_north = True
-        except IndexError:
-            pass
-        try:
-            if (col != 0) and (maze[row][col-1] != self.wall):
-                path_west = True
-        except IndexError:
-            pass
+        # the grid is flat, so stepping off the east or west edge would wrap
+        # around onto the next or previous row; check the bounds instead
+        path_north = row != 0 and cells[i-cols] != WALL
+        path_south = row+1 < maze.rows and cells[i+cols] != WALL
+        path_east = col+1 < cols and cells[i+1] != WALL
+        path_west = col != 0 and cells[i-1] != WALL
 
         return path_north, path_south, path_east, path_west
 
@@ -325,7 +1419,7 @@ class MazeSolver:
         direction.
 
         Args:
-            maze:           a list of strings
+            maze:           a Grid
             row (int):      the row index
             col (int):      the column index
 
@@ -334,7 +1428,7 @@ class MazeSolver:
         """
         paths = self.get_paths(maze, row, col)
         num_paths = sum([1 for p in paths if p])
-        if ((maze[row][col] in [self.path, self.start, self.dest]) and
+        if ((maze.get(row, col) in (PATH, START, DEST)) and
             (num_paths == 1)):
             return True
         else:
@@ -347,7 +1441,7 @@ class MazeSolver:
         from start to destination (both are 'walled in').
 
         Args:
-            maze:           a list of strings
+            maze:           a Grid
             row (int):      the row index
             col (int):      the column index
 
@@ -367,7 +1461,7 @@ class MazeSolver:
         three sides.
 
         Args:
-            maze:           a list of strings
+            maze:           a Grid
             row (int):      the row index
             col (int):      the column index
 
@@ -376,49 +1470,301 @@ class MazeSolver:
         """
         paths = self.get_paths(maze, row, col)
         num_paths = sum([1 for path in paths if path])
-        if ((maze[row][col] in [self.path, self.start, self.dest]) and
+        if ((maze.get(row, col) in (PATH, START, DEST)) and
             (num_paths > 2)):
             return True
         else:
             return False
 
-    def fill_in_dead_ends(self, maze):
+    def fill_in_dead_ends(self, maze, method='worklist', walled=None):
         """Fill in all dead-ends with wall.
 
         Does not fill in start or destination tiles if these happen to
         lie at dead-ends.
 
+        With the 'worklist' method, the number of open paths at every tile is
+        counted once, and the dead-ends are kept on a worklist. Filling a
+        dead-end only re-examines the one neighbour it was connected to, so
+        the whole fill is linear in the number of open tiles, however long
+        the corridors are.
+
+        With the 'bulk' method, every dead-end in the maze is walled off at
+        once in a sweep over bitmasks of the whole maze, and the sweep is
+        repeated until there are none left. Each sweep runs in C, which pays
+        off on wide, shallow mazes. The result is the same, except that a
+        stretch of path cut off from the start, the destination and every
+        loop may be filled in completely instead of down to one tile.
+
+        Args:
+            maze:   a Grid
+
+        Keyword Args:
+            method (str):   'worklist' or 'bulk'
+            walled (list):  if given, the flat index of every tile walled off
+                            is appended to it
+
+        Returns:
+            maze:   the maze with no dead-ends
+        """
+
+        if method not in ('worklist', 'bulk'):
+            raise ValueError("method must be 'worklist' or 'bulk'")
+        stats = self.stats
+        if stats is None:
+            if method == 'bulk':
+                return self._fill_in_dead_ends_bulk(maze, walled)
+            return self._fill_in_dead_ends_worklist(maze, walled)
+        start = time.perf_counter()
+        walls = maze.cells.count(WALL)
+        if method == 'bulk':
+            maze = self._fill_in_dead_ends_bulk(maze, walled)
+        else:
+            maze = self._fill_in_dead_ends_worklist(maze, walled)
+        stats.add('fill_in_dead_ends', time.perf_counter() - start)
+        stats.count('fill_passes')
+        stats.count('cells_filled', maze.cells.count(WALL) - walls)
+        return maze
+
+    def _fill_in_dead_ends_worklist(self, maze, walled=None):
+        """Fill in all dead-ends from a worklist of them.
+
+        See fill_in_dead_ends().
+
+        Args:
+            maze:   a Grid
+
+        Keyword Args:
+            walled (list):  see fill_in_dead_ends()
+
+        Returns:
+            maze:   the maze with no dead-ends
+        """
+        cells = maze.cells
+        degrees = self._degrees(maze)
+        work = [i for i in range(len(cells))
+                if cells[i] == PATH and degrees[i] == 1]
+        return self._fill_from(maze, degrees, work, walled)
+
+    def _fill_in_new_dead_ends(self, maze, paths, wall, walled):
+        """Fill in the dead-ends left by a wall that broke a loop.
+
+        The maze had no dead-ends before the wall went in, so only the tiles
+        next to it can have become dead-ends, and the worklist starts from
+        them alone. Their open paths are read from paths rather than counted
+        over the whole maze, so the fill only touches the tiles it fills in
+        and their neighbours. The maze comes out just as the 'worklist'
+        method of fill_in_dead_ends() would leave it.
+
+        Args:
+            maze:           a Grid
+            paths (_Paths): the open sides of the maze, with the new wall
+                            already closed in it; it is left for the caller
+                            to close the walled tiles in
+            wall (int):     flat index of the new wall
+            walled (list):  see fill_in_dead_ends()
+
+        Returns:
+            maze:   the maze with no dead-ends
+        """
+        if self.stats is not None:
+            start = time.perf_counter()
+            filled = len(walled)
+        cells = maze.cells
+        cols = maze.cols
+        degrees = _Degrees(paths)
+        # the neighbours in flat index order, as a scan of the maze finds them
+        work = [j for j, at_edge in ((wall-cols, wall < cols),
+                                     (wall-1, wall % cols == 0),
+                                     (wall+1, wall % cols + 1 == cols),
+                                     (wall+cols, wall+cols >= len(cells)))
+                if not at_edge and cells[j] == PATH and degrees[j] == 1]
+        maze = self._fill_from(maze, degrees, work, walled)
+        if self.stats is not None:
+            self.stats.add('fill_in_dead_ends', time.perf_counter() - start)
+            self.stats.count('fill_passes')
+            self.stats.count('cells_filled', len(walled) - filled)
+        return maze
+
+    def _fill_from(self, maze, degrees, work, walled=None):
+        """Fill in dead-ends from a worklist, as the 'worklist' method does.
+
+        Args:
+            maze:           a Grid
+            degrees:        the number of open paths at each flat index;
+                            counted down as tiles are filled
+            work (list):    flat indices of the dead-ends to start from, in
+                            order
+
+        Keyword Args:
+            walled (list):  see fill_in_dead_ends()
+
+        Returns:
+            maze:   the maze with no dead-ends
+        """
+        cells = maze.cells
+        cols = maze.cols
+        size = len(cells)
+        work = deque(work)
+        # the tiles filled, in the order they were filled
+        order = []
+        cut_off = []
+        while work:
+            i = work.popleft()
+            if cells[i] != PATH or degrees[i] != 1:
+                continue
+            cells[i] = WALL
+            order.append(i)
+            # a dead-end has exactly one open neighbour
+            col = i % cols
+            if i >= cols and cells[i-cols] != WALL:
+                j = i - cols
+            elif i+cols < size and cells[i+cols] != WALL:
+                j = i + cols
+            elif col+1 < cols and cells[i+1] != WALL:
+                j = i + 1
+            else:
+                j = i - 1
+            degrees[j] -= 1
+            if cells[j] == PATH:
+                if degrees[j] == 1:
+                    work.append(j)
+                elif degrees[j] == 0:
+                    cut_off.append(j)
+
+        if cut_off:
+            filled = set(order)
+            for i in cut_off:
+                self._refill_cut_off(maze, i, filled)
+        if walled is not None:
+            # the refill may have left a different tile of a stretch open
+            walled.extend(i for i in order if cells[i] == WALL)
+            walled.extend(i for i in cut_off if cells[i] == WALL)
+        return maze
+
+    def _fill_in_dead_ends_bulk(self, maze, walled=None):
+        """Fill in all dead-ends with sweeps over bitmasks of the maze.
+
+        See fill_in_dead_ends().
+
         Args:
-            maze:   a list of strings
+            maze:   a Grid
+
+        Keyword Args:
+            walled (list):  see fill_in_dead_ends()
 
         Returns:
             maze:   the maze with no dead-ends
         """
+        if not maze.cells:
+            return maze
+        cols = maze.cols
+        is_open = maze.mask(OPEN_CODES)
+        fillable = maze.mask([PATH])
+        was_open = is_open
+        # keep east and west neighbours from wrapping onto the next row
+        not_first_col, not_last_col = maze.column_masks()
+
+        while True:
+            # bit i of each mask is set if tile i has an open path that way
+            south = is_open >> cols
+            north = is_open << cols
+            east = (is_open >> 1) & not_last_col
+            west = (is_open << 1) & not_first_col
+            odd = north ^ south ^ east ^ west
+            two_or_more = ((north & (south | east | west)) |
+                           (south & (east | west)) | (east & west))
+            dead_ends = odd & ~two_or_more & fillable
+            if not dead_ends:
+                break
+            is_open &= ~dead_ends
+            fillable &= ~dead_ends
+
+        maze.wall_off(was_open & ~is_open)
+        if walled is not None:
+            walled.extend(Grid.bits(was_open & ~is_open))
+        return maze
+
+    def _degrees(self, maze):
+        """Count the open paths at every tile of the maze.
+
+        Args:
+            maze:   a Grid
+
+        Returns:
+            degrees (bytearray):    the number of open paths at each flat
+                                    index
+        """
+        cells = maze.cells
+        cols = maze.cols
+        size = len(cells)
+        degrees = bytearray(size)
+        for i in range(size):
+            if cells[i] == WALL:
+                continue
+            col = i % cols
+            degrees[i] = ((i >= cols and cells[i-cols] != WALL) +
+                          (i+cols < size and cells[i+cols] != WALL) +
+                          (col+1 < cols and cells[i+1] != WALL) +
+                          (col != 0 and cells[i-1] != WALL))
+        return degrees
+
+    def _refill_cut_off(self, maze, i, filled):
+        """Redo the fill of a stretch of path cut off from everything else.
+
+        A stretch of path with no loop, start or destination in it is filled
+        in down to a single tile. Which tile is left depends on the order the
+        tiles are filled in, so the stretch is restored and filled in again
+        by scanning it row by row until nothing changes, which leaves the same
+        tile a full scan of the maze would.
+
+        Args:
+            maze:               a Grid
+            i (int):            flat index of the tile left over
+            filled (set):       flat indices of the tiles filled in by the
+                                worklist
+        """
+        cells = maze.cells
+        cols = maze.cols
+        size = len(cells)
+        stretch = [i]
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            col = j % cols
+            for k, at_edge in ((j-cols, j < cols), (j+cols, j+cols >= size),
+                               (j+1, col+1 == cols), (j-1, col == 0)):
+                if at_edge:
+                    continue
+                if k in filled:
+                    filled.discard(k)
+                    cells[k] = PATH
+                    stretch.append(k)
+                    stack.append(k)
+        stretch.sort()
 
         dead_ends = True
         while dead_ends:
             dead_ends = False
-            for row in range(0, len(maze)):
-                for col in range(0, len(maze[row])):
-                    if (maze[row][col] == self.path and
-                        self.is_dead_end(maze, row, col)):
-                        maze = self.insert_char(maze, row, col, self.wall)
+            for j in stretch:
+                if cells[j] == PATH:
+                    row, col = divmod(j, cols)
+                    if self.is_dead_end(maze, row, col):
+                        cells[j] = WALL
                         dead_ends = True
-        return maze
 
     def count_dead_ends(self, maze):
         """Counts the number of dead-ends in the maze.
 
         Args:
-            maze: a list of strings
+            maze: a Grid
 
         Returns:
             count (int)
         """
 
         count = 0
-        for row in range(0, len(maze)):
-            for col in range(0, len(maze[row])):
+        for row in range(maze.rows):
+            for col in range(maze.cols):
                 if self.is_dead_end(maze, row, col):
                     count += 1
         return count
@@ -448,8 +1794,8 @@ class MazeSolver:
 
         If we are starting at S, and there is more than one open path
         (S is a branch, for instance), then:
-        1) If we are turning randomly right and left, then choose our
-           starting direction randomly.
+        1) If we are turning randomly right and left, then choose one of
+           the open paths at random.
         2) If we are consistently turning right, then choose the first
            open path clockwise from north.
         3) If we are consistently turning left, then choose the first
@@ -466,46 +1812,13 @@ class MazeSolver:
             col (int):      column index of the new position
         """
 
-        path_north, path_south, path_east, path_west = paths
-
+        sides = sum(1 << heading for heading, path in enumerate(paths) if path)
         if turn == 'random':
-            no_path = True
-            while no_path:
-                # repeat until we randomly choose an open path
-                direction = random.choice(['path_north', 'path_south',
-                                           'path_east', 'path_west'])
-                if (direction == 'path_north') and (path_north):
-                    row, col = MazeSolver.move_north(row, col)
-                    no_path = False
-                elif (direction == 'path_south') and (path_south):
-                    row, col = MazeSolver.move_south(row, col)
-                    no_path = False
-                elif (direction == 'path_east') and (path_east):
-                    row, col = MazeSolver.move_east(row, col)
-                    no_path = False
-                elif (direction == 'path_west') and (path_west):
-                    row, col = MazeSolver.move_west(row, col)
-                    no_path = False
-        elif turn == 'right':
-            if path_north:
-                row, col = MazeSolver.move_north(row, col)
-            elif path_east:
-                row, col = MazeSolver.move_east(row, col)
-            elif path_south:
-                row, col = MazeSolver.move_south(row, col)
-            else:
-                row, col = MazeSolver.move_west(row, col)
+            heading = self.rng.choice([heading for heading in range(4)
+                                       if sides & 1 << heading])
         else:
-            # turn == 'left'
-            if path_south:
-                row, col = MazeSolver.move_south(row, col)
-            elif path_west:
-                row, col = MazeSolver.move_west(row, col)
-            elif path_north:
-                row, col = MazeSolver.move_north(row, col)
-            else:
-                row, col = MazeSolver.move_east(row, col)
-        return row, col
+            heading = _FIRST_HEADING[(turn != 'right')*16 + sides]
+        return row + _ROW_STEP[heading], col + _COL_STEP[heading]
 
     def take_step(self, row, col, prev_row, prev_col, paths, turn):
         """Takes a step in the maze.
@@ -525,120 +1838,85 @@ class MazeSolver:
             prev_col (int):   the new previous column index
         """
 
-        path_north, path_south, path_east, path_west = paths
-
-        temp_row = row
-        temp_col = col
-        if (prev_row == row) and (col > prev_col):
-            # coming from the west
-            if turn == 'right':
-                if path_south:
-                    row, col = MazeSolver.move_south(row, col)
-                elif path_east:
-                    row, col = MazeSolver.move_east(row, col)
-                else:
-                    row, col = MazeSolver.move_north(row, col)
-            else:
-                # turn == 'left'
-                if path_north:
-                    row, col = MazeSolver.move_north(row, col)
-                elif path_east:
-                    row, col = MazeSolver.move_east(row, col)
-                else:
-                    row, col = MazeSolver.move_south(row, col)
-        elif (prev_row == row) and (col < prev_col):
-            # coming from the east
-            if turn == 'right':
-                if path_north:
-                    row, col = MazeSolver.move_north(row, col)
-                elif path_west:
-                    row, col = MazeSolver.move_west(row, col)
-                else:
-                    row, col = MazeSolver.move_south(row, col)
-            else:
-                # turn == 'left'
-                if path_south:
-                    row, col = MazeSolver.move_south(row, col)
-                elif path_west:
-                    row, col = MazeSolver.move_west(row, col)
-                else:
-                    row, col = MazeSolver.move_north(row, col)
-        elif (prev_col == col) and (row > prev_row):
-            # coming from the north
-            if turn == 'right':
-                if path_west:
-                    row, col = MazeSolver.move_west(row, col)
-                elif path_south:
-                    row, col = MazeSolver.move_south(row, col)
-                else:
-                    row, col = MazeSolver.move_east(row, col)
-            else:
-                # turn == 'left'
-                if path_east:
-                    row, col = MazeSolver.move_east(row, col)
-                elif path_south:
-                    row, col = MazeSolver.move_south(row, col)
-                else:
-                    row, col = MazeSolver.move_west(row, col)
-        else:
-            # coming from the south
-            if turn == 'right':
-                if path_east:
-                    row, col = MazeSolver.move_east(row, col)
-                elif path_north:
-                    row, col = MazeSolver.move_north(row, col)
-                else:
-                    row, col = MazeSolver.move_west(row, col)
-            else:
-                # turn == 'left'
-                if path_west:
-                    row, col = MazeSolver.move_west(row, col)
-                elif path_north:
-                    row, col = MazeSolver.move_north(row, col)
-                else:
-                    row, col = MazeSolver.move_east(row, col)
-        prev_row = temp_row
-        prev_col = temp_col
-
-        return row, col, prev_row, prev_col
+        # the walker is heading the way it came; anything else is taken as
+        # heading north
+        heading = _HEADINGS.get((row - prev_row, col - prev_col), 0)
+        sides = sum(1 << heading for heading, path in enumerate(paths) if path)
+        heading = _NEXT_HEADING[((turn != 'right')*4 + heading)*16 + sides]
+        return (row + _ROW_STEP[heading], col + _COL_STEP[heading], row, col)
 
-    def break_loop(self, maze, turn='random'):
+    def break_loop(self, maze, turn='random', trail=None):
         """Find a loop in the maze, and break it by inserting a wall.
 
         The loop is recognized when the walker returns to a branch.
         The loop is broken by walling off the branch behind the walker.
 
         Args:
-            maze:           a list of strings
+            maze:           a Grid
 
         Keyword Args:
             turn (str):     determines whether the maze walker turns right,
                             left, or randomly at branches in the path
+            trail (list):   every step of the walker is appended to it as a
+                            (row, col) tuple; defaults to the last foray in
+                            self.steps
 
         Returns:
             False, if no loop is found.
             The maze with the loop broken, if a loop is found.
         """
 
+        if trail is None:
+            # see self.solve_maze() for the structure of self.steps
+            trail = self.steps[-1][1][-1][1]
+        if self._break_loop(maze, turn, trail, _Paths(maze)) is None:
+            return False
+        return maze
+
+    def _break_loop(self, maze, turn, trail, paths):
+        """Walk the maze as break_loop() does, looking the paths up in paths.
+
+        Args:
+            maze:           a Grid
+            turn (str):     see break_loop()
+            trail (list):   see break_loop(); None keeps no steps
+            paths (_Paths): the open sides of the maze; walls that break a
+                            loop are closed in it too
+
+        Returns:
+            None, if no loop is found.
+            The flat index of the wall that broke the loop, if one is found.
+        """
+
+        cells = maze.cells
+        cols = maze.cols
+        sides = paths.sides
+        # the step along the flat cells for each heading
+        steps = (-cols, cols, 1, -1)
+        S = self.S_row*cols + self.S_col
+        D = self.D_row*cols + self.D_col
         # start at S
         row, col = self.S_row, self.S_col
-        path_north, path_south, path_east, path_west = self.get_paths(maze,
-                row, col)
-        paths = [path_north, path_south, path_east, path_west]
-        prev_row, prev_col = None, None
-        branches = []
+        i = S
+        prev = None
+        heading = None
+        # the branches seen on this foray, as flat indices
+        branches = set()
         # when S and/or D are not dead-ends, use seen_S and seen_D to avoid
         # infinite loops
         seen_S = False
         seen_D = False
         while True:
-            # see self.solve_maze() for the structure of self.steps
             # we are storing every step in nested lists
-            self.steps[-1][1][-1][1].append((row, col))
+            if trail is not None:
+                trail.append((row, col))
             if turn == 'random':
-                this_turn = random.choice(['right', 'left'])
+                this_turn = self.rng.choice((_RIGHT, _LEFT))
             else:
-                this_turn = turn
+                this_turn = _RIGHT if turn == 'right' else _LEFT
+            open_sides = sides[i]
+            walkable = _WALKABLE[cells[i]]
+            num_paths = _DEGREE[open_sides]
 
             ################################################################
             # Check if the current location is the start, the destination, #
@@ -646,100 +1924,164 @@ class MazeSolver:
             ################################################################
 
             # check if we are returning to the start;
-            if prev_row is not None:
-                if (row, col) == (self.S_row, self.S_col):
+            if prev is not None:
+                if i == S:
                     # if we have returned to S in a dead-end, return
-                    if self.is_dead_end(maze, row, col):
-                        return False
+                    if walkable and num_paths == 1:
+                        return None
                     else:
                         # if we are returning to S for the second time,
                         # start over
                         if seen_S is True:
-                            maze = self.insert_char(maze, prev_row, prev_col,
-                                                    self.wall)
-                            return maze
+                            return self._wall_behind(maze, paths, prev)
                         # if we are returning to S for the first time,
                         # keep going
                         else:
                             seen_S = True
 
             # check if we are at the destination
-            if (row, col) == (self.D_row, self.D_col):
-                if self.is_dead_end(maze, row, col):
-                    return False
+            if i == D:
+                if walkable and num_paths == 1:
+                    return None
                 else:
                     if seen_D is True:
-                        maze = self.insert_char(maze, prev_row, prev_col,
-                                                self.wall)
-                        return maze
+                        return self._wall_behind(maze, paths, prev)
                     else:
                         seen_D = True
 
+            is_branch = walkable and num_paths > 2
             # check if we are completing a loop
-            if (self.is_branch(maze, row, col) and
-                ((row, col) in branches) and
-                (maze[prev_row][prev_col] not in [self.start, self.dest])):
+            if (is_branch and i in branches and
+                cells[prev] not in (START, DEST)):
                 # put a wall at the previous position
-                maze = self.insert_char(maze, prev_row, prev_col, self.wall)
-                return maze
+                return self._wall_behind(maze, paths, prev)
 
             # check if we are at a branch for the first time
-            if (self.is_branch(maze, row, col) and
-                (row, col) not in branches):
+            if is_branch:
                 # record the location of the branch
-                branches.append((row, col))
+                branches.add(i)
 
             ###############
             # Take a step #
             ###############
 
             # if we are just starting out, there are special rules for how to
-            # take the first step
-            if (prev_row, prev_col) == (None, None):
-                prev_row = row
-                prev_col = col
-                row, col = self.take_first_step(row, col, paths, this_turn)
-            # otherwise take the first open path without back-tracking
+            # take the first step; otherwise take the first open path without
+            # back-tracking
+            if heading is None:
+                heading = _FIRST_HEADING[this_turn*16 + open_sides]
             else:
-                row, col, prev_row, prev_col = self.take_step(row, col,
-                                               prev_row, prev_col, paths,
-                                               this_turn)
-            # get open paths at new position
-            path_north, path_south, path_east, path_west = self.get_paths(maze,
-                                                           row, col)
-            paths = [path_north, path_south, path_east, path_west]
+                heading = _NEXT_HEADING[(this_turn*4 + heading)*16 +
+                                        open_sides]
+            prev = i
+            i += steps[heading]
+            row += _ROW_STEP[heading]
+            col += _COL_STEP[heading]
+
+    def _wall_behind(self, maze, paths, prev):
+        """Break a loop by walling off the tile behind the walker.
+
+        Returns:
+            prev (int):     flat index of the new wall
+        """
+        prev_row, prev_col = divmod(prev, maze.cols)
+        self.insert_char(maze, prev_row, prev_col, self.wall)
+        paths.wall([prev])
+        return prev
 
     def blaze_trail(self, solution):
         """Mark the solution on the original maze.
 
         Args:
-            solution (list):        a maze completely filled in except for a
+            solution (Grid):        a maze completely filled in except for a
                                     single path from start to finish
 
         Returns:
-            blazed_trail (list):    The original maze with the solution marked
+            blazed_trail (Grid):    The original maze with the solution marked
                                     on it.
         """
 
-        blazed_trail = self.original_maze[:]
-        for row in range(0, len(blazed_trail)):
-            for col in range(0, len(blazed_trail[row])):
-                if solution[row][col] == self.path:
-                    blazed_trail = self.insert_char(blazed_trail,
-                                                    row, col, self.blaze)
+        if self.stats is not None:
+            start = time.perf_counter()
+        blazed_trail = self.original_maze.copy()
+        for i in solution.find(PATH):
+            blazed_trail.cells[i] = BLAZE
+        if self.stats is not None:
+            self.stats.add('blaze_trail', time.perf_counter() - start)
         return blazed_trail
 
-    def solve_maze(self, n=50):
+    def solve_maze(self, n=50, fill='worklist', workers=None, seed=None,
+                   target=None, max_seconds=None, trace='full',
+                   strategy='random'):
         """Solve the maze n times, and return the shortest solution.
 
+        Each attempt is independent of the others, so with workers set they
+        are spread over a pool of processes. Every attempt seeds its own
+        random walker from the master seed, so a given seed gives the same
+        solutions in the same order however many workers there are.
+
+        Solving can stop before all n attempts are made: as soon as an
+        attempt finds a path as short as target, or once max_seconds have
+        passed. Either way the shortest solution found so far is returned.
+
+        The trace level sets how much of each attempt is kept:
+            'full':     every step in self.steps and every broken loop in
+                        self.breaks, as get_forays() needs
+            'summary':  only the number of steps of each foray, in place of
+                        the steps themselves, and no broken loops
+            'none':     no steps or broken loops, and only the shortest
+                        solution in self.solutions and self.solution_lengths
+
+        The strategy sets how loops are broken:
+            'random':   a walker turns randomly at branches and walls off the
+                        tile behind it when it gets back to a branch
+            'bfs-tree': loops are broken off a breadth-first search tree
+                        from start, which always leaves the shortest path;
+                        the maze is solved once, whatever n is
+
         Keyword Args:
-            n (int):    number of times to solve the maze
+            n (int):        number of times to solve the maze
+            fill (str):     how to fill in dead-ends, 'worklist' or 'bulk'
+                            (see fill_in_dead_ends())
+            workers (int):  number of processes to run the attempts in; by
+                            default they all run in this process
+            seed (int):     master seed for the random walker; drawn at
+                            random if omitted, and kept in self.seed
+            target (int):   a path length (in path tiles, not counting start
+                            and destination) to stop at; 'optimal' works out
+                            the shortest possible length first with a
+                            breadth-first search
+            max_seconds (float):
+                            time limit; an attempt still running when it
+                            runs out is abandoned and not recorded
+            trace (str):    'full', 'summary' or 'none'; kept in self.trace
+            strategy (str): 'random' or 'bfs-tree'
 
         Returns:
-            shortest_solution (list):   The shortest path from start to finish
+            shortest_solution (Grid):   The shortest path from start to finish
                                         marked onto the original maze.
+            None:                       if no attempt found a path
         """
 
+        if trace not in ('full', 'summary', 'none'):
+            raise ValueError("trace must be 'full', 'summary' or 'none'")
+        if strategy not in ('random', 'bfs-tree'):
+            raise ValueError("strategy must be 'random' or 'bfs-tree'")
+        self.trace = trace
+        if self.stats is not None:
+            started = time.perf_counter()
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        master = random.Random(seed)
+        seeds = [master.getrandbits(64) for i in range(n)]
+        if target == 'optimal':
+            target = self._optimal_length()
+        deadline = None
+        if max_seconds is not None:
+            # wall-clock time, so that worker processes can check it too
+            deadline = time.time() + max_seconds
+
         self.steps = []
 
         ######################################################################
@@ -757,53 +2099,374 @@ class MazeSolver:
         ######################################################################
         # self.breaks has the following structure:
         #
-        # [ [ solution index, [ broken loop, broken loop, ...]]]
+        # [ [ solution index, [ filled tiles, broken loop, ...]]]
         #
-        # There is a maze with a broken loop for each foray.
+        # Rather than a whole maze per foray, only the changes are kept, as
+        # arrays of flat tile indices. The first array holds the dead-end
+        # tiles filled in before the first foray. Each foray then adds one
+        # array: the wall that broke a loop followed by the dead-end tiles
+        # filled in after it, or an empty array if no loop was broken.
+        # get_forays() replays them over the original maze.
         ######################################################################
 
         self.solutions = []
         self.solution_lengths = []
-        for i in range(n):
-            self.steps.append([i, []]) # i is the solution index
-            self.breaks.append([i, []])
-            working_maze = self.original_maze[:] # refresh working maze 
-            working_maze = self.fill_in_dead_ends(working_maze)
-            self.breaks[-1][1].append(working_maze)
-            # walk the maze turning randomly at branches until there are no more
-            # loops
-            num_branches = self.num_branches(working_maze)
-            j = 0 # j is the foray index
-            while num_branches > 0:
-                self.steps[-1][1].append([j, []])
-                broken_loop = self.break_loop(working_maze, turn='random')
-                if broken_loop:
-                    working_maze = broken_loop[:]
-                    working_maze = self.fill_in_dead_ends(working_maze)
-                num_branches = self.num_branches(working_maze)
-                self.breaks[-1][1].append(working_maze)
-                j += 1
-            # filter out spurious solutions where S and/or D are completely walled
-            # in (there is no path between S and D)
-            if (not self.is_walled_in(working_maze, self.S_row, self.S_col) and
-                not self.is_walled_in(working_maze, self.D_row, self.D_col)):
-                self.solutions.append(working_maze)
-                self.solution_lengths.append(self.count_char(working_maze,
-                    self.path))
-                print(self.solution_lengths[-1], end=' ', flush=True)
-            else:
-                print('*', end=' ', flush=True)
+        pool = None
+        if strategy == 'bfs-tree':
+            # the tree gives the same solution every time
+            attempts = map(self._tree_attempt, [fill], [deadline], [trace])
+        elif workers is None:
+            attempts = map(self._attempt, range(n), seeds, repeat(fill, n),
+                           repeat(deadline, n), repeat(trace, n))
+        else:
+            # set once solve_maze() stops waiting, so that attempts still
+            # running in the workers give up instead of running on
+            stop = multiprocessing.Event()
+            pool = futures.ProcessPoolExecutor(workers,
+                       initializer=_init_worker,
+                       initargs=(self._worker_state(stop),))
+            attempts = self._gathered(self._results(
+                [pool.submit(_run_attempt, i, seeds[i], fill, deadline, trace)
+                 for i in range(n)], deadline))
+        if pool is None and self.stats is not None:
+            attempts = self._recorded(attempts)
+        try:
+            # results come back in attempt order, whichever worker ran them
+            for attempt in attempts:
+                if attempt is None:
+                    # out of time in the middle of an attempt
+                    break
+                working_maze, steps, breaks = attempt
+                self.steps.append(steps)
+                self.breaks.append(breaks)
+                if working_maze is not None:
+                    length = self.count_char(working_maze, self.path)
+                    if trace != 'none':
+                        self.solutions.append(working_maze)
+                        self.solution_lengths.append(length)
+                    elif (not self.solution_lengths or
+                          length < self.solution_lengths[0]):
+                        self.solutions = [working_maze]
+                        self.solution_lengths = [length]
+                    print(length, end=' ', flush=True)
+                    if target is not None and length <= target:
+                        break
+                else:
+                    print('*', end=' ', flush=True)
+                if deadline is not None and time.time() >= deadline:
+                    break
+        finally:
+            if pool is not None:
+                # drop the attempts that have not started, and stop those
+                # that have
+                stop.set()
+                pool.shutdown(wait=False, cancel_futures=True)
         # mark the solutions on the original maze
         for i, solution in enumerate(self.solutions):
             self.solutions[i] = self.blaze_trail(solution)
         # return the shortest solution
         # this is a monstrous way to find the shortest solution, but I don't
         # want to import numpy.argmin just for this one line
-        self.shortest_solution = self.solutions[
-            self.solution_lengths.index(min(self.solution_lengths))]
+        self.shortest_solution = None
+        if self.solutions:
+            self.shortest_solution = self.solutions[
+                self.solution_lengths.index(min(self.solution_lengths))]
+        if self.stats is not None:
+            self.stats.add('solve_maze', time.perf_counter() - started)
         print('\n')
         return self.shortest_solution
 
+    def _optimal_length(self):
+        """Return the length of the shortest path from start to destination.
+
+        The length counts the path tiles between start and destination, like
+        solution_lengths does. Returns None if there is no path.
+        """
+        maze = self.original_maze
+        target = maze.index(self.D_row, self.D_col)
+        parents = self._bfs(maze, maze.index(self.S_row, self.S_col), target)
+        if parents[target] == -1:
+            return None
+        return len(self._trace(parents, target)) - 2
+
+    @staticmethod
+    def _results(pending, deadline):
+        """Yield the results of futures in order until the deadline.
+
+        Args:
+            pending (list):     futures of solve_maze() attempts
+            deadline (float):   a time.time() value, or None
+
+        Yields:
+            the result of each future; None if the deadline passes while
+            waiting for one
+        """
+        for future in pending:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline - time.time())
+            try:
+                yield future.result(timeout)
+            except futures.TimeoutError:
+                yield None
+                return
+
+    def _gathered(self, results):
+        """Yield the attempts of worker results, adding in their stats.
+
+        Args:
+            results:    (attempt, SolverStats or None) from _run_attempt(),
+                        or None as _results() yields it
+        """
+        for result in results:
+            if result is None:
+                yield None
+                return
+            attempt, stats = result
+            if stats is not None:
+                self.stats.merge(stats)
+            yield attempt
+
+    def _recorded(self, attempts):
+        """Yield attempts made in this process, recording each in self.stats.
+
+        Args:
+            attempts:   an iterator that makes each attempt as it is asked
+                        for the next
+        """
+        stats = self.stats
+        while True:
+            stats._start_attempt()
+            attempt = next(attempts, _MISSING)
+            if attempt is _MISSING:
+                return
+            stats._end_attempt()
+            yield attempt
+
+    def _attempt(self, i, seed, fill, deadline=None, trace='full'):
+        """Make one attempt at solving the maze with the random walker.
+
+        Args:
+            i (int):        the solution index
+            seed (int):     seeds the walker's random turns
+            fill (str):     see fill_in_dead_ends()
+
+        Keyword Args:
+            deadline (float):   a time.time() value; the attempt is
+                                abandoned if it is still running then
+            trace (str):        see solve_maze()
+
+        Returns:
+            None, if the attempt was abandoned. Otherwise:
+            working_maze (Grid):    the maze filled in down to a path from
+                                    start to destination, or None if the
+                                    start or destination got walled in
+            steps (list):           this attempt's entry in self.steps
+            breaks (list):          this attempt's entry in self.breaks
+        """
+        self.rng = random.Random(seed)
+        steps = [i, []] # i is the solution index
+        breaks = [i, []]
+        working_maze = self.original_maze.copy() # refresh working maze
+        working_maze = self.fill_in_dead_ends(working_maze, method=fill)
+        # filling in a large maze can take a while by itself
+        if self._stopped(deadline):
+            return None
+        if trace == 'full':
+            breaks[1].append(array('I', working_maze.changes(
+                self.original_maze.cells)))
+        # walk the maze turning randomly at branches until there are no more
+        # loops
+        paths = _Paths(working_maze)
+        num_branches = self._num_branches(paths, working_maze)
+        j = 0 # j is the foray index
+        while num_branches > 0:
+            if self._stopped(deadline):
+                return None
+            if trace == 'full':
+                trail = []
+            elif trace == 'summary' or self.stats is not None:
+                trail = _Tally()
+            else:
+                trail = None
+            if self.stats is None:
+                wall = self._break_loop(working_maze, 'random', trail, paths)
+            else:
+                start = time.perf_counter()
+                wall = self._break_loop(working_maze, 'random', trail, paths)
+                self._count_foray(time.perf_counter() - start, trail,
+                                  wall is not None)
+                # the walker looks up the open sides once a step
+                self.stats.count('path_lookups', len(trail))
+            if trace == 'full':
+                steps[1].append([j, trail])
+            elif trace == 'summary':
+                steps[1].append([j, trail.count])
+            delta = array('I')
+            if wall is not None:
+                # the walker has already closed the paths onto the new wall
+                walled = []
+                if fill == 'worklist':
+                    working_maze = self._fill_in_new_dead_ends(
+                        working_maze, paths, wall, walled)
+                else:
+                    working_maze = self.fill_in_dead_ends(
+                        working_maze, method=fill, walled=walled)
+                paths.wall(walled)
+                if trace == 'full':
+                    # the new wall goes first
+                    delta.append(wall)
+                    delta.extend(sorted(walled))
+            num_branches = self._num_branches(paths, working_maze)
+            if trace == 'full':
+                breaks[1].append(delta)
+            j += 1
+        # filter out spurious solutions where S and/or D are completely walled
+        # in (there is no path between S and D)
+        if (self.is_walled_in(working_maze, self.S_row, self.S_col) or
+            self.is_walled_in(working_maze, self.D_row, self.D_col)):
+            working_maze = None
+        return working_maze, steps, breaks
+
+    def _num_branches(self, paths, maze):
+        """Count the branches left, timing the count in self.stats."""
+        if self.stats is None:
+            return paths.num_branches(maze)
+        start = time.perf_counter()
+        count = paths.num_branches(maze)
+        self.stats.add('num_branches', time.perf_counter() - start)
+        self.stats.count('branch_scans')
+        return count
+
+    def _count_foray(self, seconds, trail, broken_loop):
+        """Record a foray in self.stats.
+
+        Args:
+            seconds (float):    the time the foray took
+            trail:              its steps, or a _Tally of them
+            broken_loop:        whether it broke a loop
+        """
+        stats = self.stats
+        stats.add('break_loop', seconds)
+        stats.count('forays')
+        stats.count('steps', len(trail))
+        if broken_loop:
+            stats.count('loops_broken')
+
+    def _tree_attempt(self, fill, deadline=None, trace='full'):
+        """Break the loops off a breadth-first search tree rooted at S.
+
+        Once the dead-ends are filled in, a leaf of the tree that is not on
+        its path to D still has two open paths, so it closes a loop. Walling
+        it off breaks the loop without cutting anything off from S, and the
+        rest of the tree is still a shortest-path tree. So leaves are walled
+        off, each with the branch of the tree that only led to it, until
+        only the tree's path from S to D is left, which is a shortest path.
+        Walling off a leaf only walks up the tree as far as the branch, so
+        the whole solve is linear in the number of tiles. Each leaf is one
+        foray, whose steps are its path down the tree from S.
+
+        Tiles the search cannot reach from S are walled off along with the
+        dead-ends filled in before the first foray.
+
+        Args:
+            fill (str):         see solve_maze()
+
+        Keyword Args:
+            deadline (float):   see _attempt()
+            trace (str):        see solve_maze()
+
+        Returns:
+            None, if the deadline passed first. Otherwise, as _attempt():
+            working_maze (Grid):    the solved maze, or None if there is no
+                                    path from S to D
+            steps (list):           this attempt's entry in self.steps
+            breaks (list):          this attempt's entry in self.breaks
+        """
+        steps = [0, []]
+        breaks = [0, []]
+        working_maze = self.original_maze.copy()
+        working_maze = self.fill_in_dead_ends(working_maze, method=fill)
+        cells = working_maze.cells
+        cols = working_maze.cols
+        S = working_maze.index(self.S_row, self.S_col)
+        D = working_maze.index(self.D_row, self.D_col)
+        parents = self._bfs(working_maze, S)
+        if self._stopped(deadline):
+            return None
+        children = bytearray(len(cells))
+        for i, parent in enumerate(parents):
+            if parent == -1:
+                cells[i] = WALL
+            elif parent != i:
+                children[parent] += 1
+        if trace == 'full':
+            breaks[1].append(array('I', working_maze.changes(
+                self.original_maze.cells)))
+        if parents[D] == -1:
+            return None, steps, breaks
+        on_path = set(self._trace(parents, D))
+        leaves = [i for i, parent in enumerate(parents)
+                  if parent != -1 and not children[i] and i not in on_path]
+        j = 0 # j is the foray index
+        while leaves:
+            if self._stopped(deadline):
+                return None
+            leaf = leaves.pop()
+            if trace != 'none' or self.stats is not None:
+                trail = [] if trace == 'full' else _Tally()
+                if self.stats is not None:
+                    start = time.perf_counter()
+                for i in self._trace(parents, leaf):
+                    trail.append(divmod(i, cols))
+                if self.stats is not None:
+                    self._count_foray(time.perf_counter() - start, trail,
+                                      True)
+                if trace == 'full':
+                    steps[1].append([j, trail])
+                elif trace == 'summary':
+                    steps[1].append([j, trail.count])
+            # wall off the leaf, and its parents up to the first that still
+            # has other children or is on the path
+            walled = array('I')
+            i = leaf
+            while True:
+                cells[i] = WALL
+                walled.append(i)
+                parent = parents[i]
+                children[parent] -= 1
+                if children[parent] or parent in on_path:
+                    break
+                i = parent
+            if trace == 'full':
+                breaks[1].append(walled)
+            j += 1
+        return working_maze, steps, breaks
+
+    def _stopped(self, deadline):
+        """Whether an attempt is to be abandoned.
+
+        It is once the deadline has passed, or in a worker process, once
+        solve_maze() has stopped waiting for attempts.
+        """
+        return ((deadline is not None and time.time() >= deadline) or
+                (self._stop is not None and self._stop.is_set()))
+
+    def _worker_state(self, stop):
+        """Return the attributes a worker process needs to make attempts.
+
+        Args:
+            stop:   a multiprocessing.Event set when attempts are to stop
+        """
+        names = ['wall', 'path', 'start', 'dest', 'blaze', 'source_wall',
+                 'source_path', 'source_start', 'source_dest',
+                 'original_maze', 'S_row', 'S_col', 'D_row', 'D_col']
+        state = {name: getattr(self, name) for name in names}
+        state['_stop'] = stop
+        # each worker records its attempts in stats of its own
+        state['stats'] = SolverStats() if self.stats is not None else None
+        return state
+
     def get_forays(self, n, return_forays=False, print_forays=True):
         """For one solution, shows the steps that break the loops.
 
@@ -821,33 +2484,1006 @@ class MazeSolver:
         """
 
         forays = []
-        for foray, maze in zip(self.steps[n][1], self.breaks[n][1]):
-            for row, col in foray[1]:
-                if maze[row][col] not in [self.start, self.dest]:
-                    maze = self.insert_char(maze, row, col, self.blaze)
+        for maze in self.iter_forays(n):
             forays.append(maze)
             if print_forays:
                 for row in maze:
-                    print(''.join(row), end='\n')
+                    print(row, end='\n')
 
         if return_forays:
             return forays
 
-    def solve_graph(self, print_solution=True, return_solution=False):
+    def iter_forays(self, n, reuse=False):
+        """For one solution, yields the steps that break the loops.
+
+        Each foray's steps are marked on its filled-in maze as it is rebuilt,
+        so replaying an attempt with many forays never holds more than one
+        or two mazes at a time.
+
+        Args:
+            n (int): a solution index
+
+        Keyword Args:
+            reuse (bool):   Yield the same Grid every time, overwriting it for
+                            each foray. Copy a maze to keep it past the next
+                            one.
+
+        Returns:
+            forays (generator): the maze of each foray, in order
+        """
+
+        if self.trace != 'full':
+            raise ValueError("forays need solve_maze(trace='full')")
+        return self._replay_forays(n, reuse)
+
+    def _replay_forays(self, n, reuse):
+        """Rebuild the maze of each foray from self.breaks and mark it."""
+        deltas = self.breaks[n][1]
+        working_maze = self.original_maze.copy()
+        for k in deltas[0]:
+            working_maze.cells[k] = WALL
+        buffer = working_maze.copy() if reuse else None
+        maze = None
+        for j, foray in enumerate(self.steps[n][1]):
+            if maze is None:
+                if reuse:
+                    maze = buffer
+                    maze.cells[:] = working_maze.cells
+                else:
+                    maze = working_maze.copy()
+                # forays that break no loop share one maze, which already
+                # holds the wall of the next foray that does
+                for delta in deltas[j + 1:]:
+                    if delta:
+                        maze.cells[delta[0]] = WALL
+                        break
+            for row, col in foray[1]:
+                if maze.get(row, col) not in (START, DEST):
+                    maze.set(row, col, BLAZE)
+            yield maze
+            if deltas[j + 1]:
+                for k in deltas[j + 1]:
+                    working_maze.cells[k] = WALL
+                maze = None
+
+    def solve_graph(self, print_solution=True, return_solution=False,
+                    bidirectional=False):
         """Returns the shortest path from start to destination marked on the
-        original maze."""
+        original maze.
+
+        If to_graph() has not been called, the maze is searched directly with
+        solve_grid() instead; there is no need to build a networkx graph just
+        to find the shortest path.
+
+        Keyword Args:
+            print_solution (bool)
+            return_solution (bool)
+            bidirectional (bool):   passed on to solve_grid() when there is
+                                    no graph
+        """
 
-        shortest_path = nx.shortest_path(self.G, (self.S_row, self.S_col),
-                                                 (self.D_row, self.D_col))[1:-1]
+        if self.G is None:
+            return self.solve_grid(print_solution=print_solution,
+                                   return_solution=return_solution,
+                                   bidirectional=bidirectional)
 
-        solution = self.original_maze[:]
+        contracted = bool(self.G.graph.get('contracted'))
+        shortest_path = self._cached(('solve_graph', contracted),
+                                     lambda: self._graph_path(contracted))
+        shortest_path = shortest_path[1:-1]
+
+        solution = self.original_maze.copy()
         for (row, col) in shortest_path:
-            solution = self.insert_char(solution, row, col, self.blaze)
+            solution.set(row, col, BLAZE)
+
+        return self._show_solution(solution, print_solution, return_solution)
+
+    def _graph_path(self, contracted):
+        """Return the (row, col) of every tile of a shortest path in G."""
+        if contracted:
+            return self._expand_corridors(nx.dijkstra_path(
+                self.G, (self.S_row, self.S_col), (self.D_row, self.D_col)))
+        return nx.shortest_path(self.G, (self.S_row, self.S_col),
+                                (self.D_row, self.D_col))
+
+    def _expand_corridors(self, nodes):
+        """Expand a path through a contracted graph into maze tiles.
+
+        Args:
+            nodes (list):   (row, col) nodes of the contracted graph
+
+        Returns:
+            path (list):    (row, col) of every tile along the path
+        """
+        path = nodes[:1]
+        for a, b in zip(nodes, nodes[1:]):
+            corridor = self.G[a][b]['cells']
+            path.extend(corridor if a < b else reversed(corridor))
+            path.append(b)
+        return path
+
+    def solve_grid(self, print_solution=True, return_solution=False,
+                   bidirectional=False):
+        """Returns the shortest path from start to destination marked on the
+        original maze.
+
+        Runs a breadth-first search straight on the maze's grid, so it needs
+        neither to_graph() nor networkx. Prints a message and returns nothing
+        if there is no path from start to destination.
+
+        With bidirectional=True, a search from the start and a search from the
+        destination take turns until they meet, which on a large maze reaches
+        far fewer tiles than one search from the start. The number of tiles
+        the search reached is kept in self.explored either way.
+
+        Keyword Args:
+            print_solution (bool)
+            return_solution (bool)
+            bidirectional (bool):   search from both ends at once
+
+        Returns:
+            solution (Grid):    the original maze with the shortest path
+                                marked on it
+        """
+
+        maze = self.original_maze
+        path, self.explored = self._cached(
+            ('solve_grid', bidirectional),
+            lambda: self._grid_path(maze, bidirectional))
+        if path is None:
+            print("""
+                    There is no path from the start
+                    to the destination.
+                  """)
+            return
+
+        solution = maze.copy()
+        for i in path[1:-1]:
+            solution.cells[i] = BLAZE
+
+        return self._show_solution(solution, print_solution, return_solution)
+
+    def _grid_path(self, maze, bidirectional):
+        """Search the maze from start to destination for solve_grid().
+
+        Returns:
+            path (list):    flat indices from start to destination, or None
+                            if there is no path
+            explored (int): the number of tiles the search reached
+        """
+        source = maze.index(self.S_row, self.S_col)
+        target = maze.index(self.D_row, self.D_col)
+        if bidirectional:
+            return self._bidirectional(maze, source, target)
+        parents = self._bfs(maze, source, target)
+        explored = len(parents) - parents.count(-1)
+        if parents[target] == -1:
+            return None, explored
+        return self._trace(parents, target), explored
+
+    def _bfs(self, maze, source, target=None):
+        """Breadth-first search of the maze from a tile.
+
+        Tiles are flat grid indices. Every tile is queued at most once, so the
+        queue is a preallocated array with a read and a write position.
+
+        Args:
+            maze:           a Grid
+            source (int):   flat index of the tile to search from
+
+        Keyword Args:
+            target (int):   flat index of a tile; the search stops as soon as
+                            it is reached
+
+        Returns:
+            parents (array):    for each tile, the flat index of the tile
+                                before it on a shortest path from source;
+                                -1 if the tile was not reached, and source
+                                is its own parent
+        """
+        is_target = bytearray(len(maze.cells))
+        if target is not None:
+            is_target[target] = 1
+        return self._search(maze, [source], is_target)[0]
+
+    def _bidirectional(self, maze, source, target):
+        """Breadth-first search from both ends of a path until they meet.
+
+        The two searches take turns to reach one more level out, the one
+        with the smaller frontier first, and stop at the first tile next to
+        one the other search has reached. The searches meet there along a
+        shortest path: any shorter meeting would have been found a level
+        earlier.
+
+        Args:
+            maze:           a Grid
+            source (int):   flat index of one end
+            target (int):   flat index of the other end
+
+        Returns:
+            path (list):    flat indices from source to target, or None if
+                            there is no path
+            explored (int): the number of tiles the searches reached
+        """
+        if source == target:
+            return [source], 1
+        cells = maze.cells
+        cols = maze.cols
+        size = len(cells)
+        parents = (array('l', [-1]) * size, array('l', [-1]) * size)
+        parents[0][source] = source
+        parents[1][target] = target
+        frontiers = [[source], [target]]
+        explored = 2
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            ours, theirs = parents[side], parents[1 - side]
+            level = []
+            for i in frontiers[side]:
+                col = i % cols
+                # -1 stands in for a step off the east or west edge
+                for j in (i-cols, i+cols,
+                          i+1 if col+1 < cols else -1,
+                          i-1 if col else -1):
+                    if 0 <= j < size and cells[j] != WALL and ours[j] == -1:
+                        if theirs[j] != -1:
+                            path = (self._trace(ours, i) +
+                                    self._trace(theirs, j)[::-1])
+                            if side:
+                                path.reverse()
+                            return path, explored + len(level)
+                        ours[j] = i
+                        level.append(j)
+            explored += len(level)
+            frontiers[side] = level
+        return None, explored
+
+    def _search(self, maze, sources, is_target):
+        """Breadth-first search of the maze from several tiles at once.
+
+        Every source starts at distance zero, so each tile is reached from
+        whichever source is nearest to it.
+
+        Args:
+            maze:                   a Grid
+            sources (list):         flat indices of the tiles to search from
+            is_target (bytearray):  flags the tiles to stop at, one byte per
+                                    tile; the search stops at the first one
+                                    it comes to
+
+        Returns:
+            parents (array):    as _bfs() returns them; each source is its
+                                own parent
+            reached (int):      the flat index of the target the search
+                                stopped at, or None
+        """
+        cells = maze.cells
+        cols = maze.cols
+        size = len(cells)
+        parents = array('l', [-1]) * size
+        queue = array('l', [0]) * size
+        tail = 0
+        for source in sources:
+            if parents[source] == -1:
+                parents[source] = source
+                queue[tail] = source
+                tail += 1
+        head = 0
+        while head < tail:
+            i = queue[head]
+            head += 1
+            if is_target[i]:
+                return parents, i
+            col = i % cols
+            # -1 stands in for a step off the east or west edge
+            for j in (i-cols, i+cols,
+                      i+1 if col+1 < cols else -1,
+                      i-1 if col else -1):
+                if 0 <= j < size and cells[j] != WALL and parents[j] == -1:
+                    parents[j] = i
+                    queue[tail] = j
+                    tail += 1
+        return parents, None
+
+    @staticmethod
+    def _trace(parents, target):
+        """Follow parents back from target to the source of the search.
+
+        Args:
+            parents (array):    as returned by _bfs()
+            target (int):       flat index of a reached tile
+
+        Returns:
+            path (list):        flat indices from the source to target
+        """
+        path = [target]
+        while parents[target] != target:
+            target = parents[target]
+            path.append(target)
+        path.reverse()
+        return path
+
+    def solve_tiled(self, filename, output=None, tile_size=64):
+        """Solves a maze file too large to load, a band of tiles at a time.
+
+        The file is read tile_size rows at a time, and each band is cut into
+        square tiles. Of each tile, only what paths across it need is kept:
+        its boundary tiles that are open to a neighbouring tile, the start
+        and destination, and the junctions between them, joined by edges
+        weighted with the length of the corridor between them. Together the
+        tiles make a boundary graph of the whole maze, and an A* search of
+        it finds a shortest path from start to destination.
+
+        The file is then read a second time and the solution written out a
+        band at a time. Only the tiles the path crosses are searched again,
+        to fill in the steps between its boundary tiles. At most two bands
+        of the maze are held at once, besides the boundary graph, which gets
+        smaller as the tiles get bigger. Neither the maze nor the solution is
+        kept; the start and destination are the first of each in the file.
+
+        Args:
+            filename (str):     name of source file
+
+        Keyword Args:
+            output (str):       name of a file to write the solution to;
+                                by default it is printed
+            tile_size (int):    the number of rows and columns of a tile
+
+        Returns:
+            length (int):   the number of path tiles between start and
+                            destination, like solution_lengths
+        """
+        if tile_size < 1:
+            raise ValueError("tile_size must be at least 1")
+        graph = {}
+        start = dest = None
+        cols = 0
+        top = 0
+        above = b''
+        bands = self._read_bands(filename, tile_size)
+        band = next(bands, None)
+        while band is not None:
+            following = next(bands, None)
+            below = following.cells[:following.cols] if following else b''
+            for code in (START, DEST):
+                i = band.cells.find(code)
+                if i != -1 and (start if code == START else dest) is None:
+                    end = (top + i // band.cols, i % band.cols)
+                    if code == START:
+                        start = end
+                    else:
+                        dest = end
+            ends = [end for end in (start, dest) if end is not None]
+            self._band_graph(band, top, above, below, tile_size, ends, graph)
+            cols = max(cols, band.cols)
+            above = band.cells[len(band.cells) - band.cols:]
+            top += band.rows
+            band = following
+        if start is None or dest is None:
+            raise ValueError("the maze needs a start and a destination")
+
+        route, length = self._astar(graph, start, dest)
+        if route is None:
+            print("""
+                    There is no path from the start
+                    to the destination.
+                  """)
+            return
+
+        # the route crosses from tile to tile between neighbouring boundary
+        # tiles; each run of it within a tile is filled in from that tile
+        runs = {}
+        first = route[0]
+        for a, b in zip(route, route[1:] + [None]):
+            if (b is None or a[0] // tile_size != b[0] // tile_size or
+                    a[1] // tile_size != b[1] // tile_size):
+                runs.setdefault(a[0] // tile_size, []).append((first, a))
+                first = b
+        with (open(output, 'w', encoding='utf-8') if output
+              else nullcontext(sys.stdout)) as f:
+            top = 0
+            for band in self._read_bands(filename, tile_size):
+                for a, b in runs.get(top // tile_size, ()):
+                    for row, col in self._tile_path(band, top, tile_size,
+                                                    a, b):
+                        if (row, col) != start and (row, col) != dest:
+                            band.set(row - top, col, BLAZE)
+                for row in band.pad(right=cols - band.cols):
+                    print(row, file=f)
+                top += band.rows
+
+        return length - 1
+
+    def _read_bands(self, filename, rows):
+        """Yield the maze in a source file as Grids of a number of rows.
+
+        The rows are read as get_maze() reads them, but each Grid is only as
+        wide as its own longest row.
+        """
+        codes = self._source_codes()
+        top = 0
+        with open(filename) as f:
+            while True:
+                band = [row.rstrip() for row in islice(f, rows)]
+                if not band:
+                    return
+                yield Grid.from_strings(band, self._chars(), codes, top)
+                top += len(band)
+
+    def _band_graph(self, band, top, above, below, tile_size, ends, graph):
+        """Add a band of tiles to solve_tiled()'s boundary graph.
+
+        Within each tile, tiles that lead nowhere but to dead ends are
+        dropped, and the corridors left between the boundary tiles, the
+        start and destination and the junctions become weighted edges.
+        Neighbouring boundary tiles of two tiles are joined by an edge of
+        weight 1.
+
+        Args:
+            band:               a Grid of tile_size rows of the maze (fewer
+                                at the bottom)
+            top (int):          the maze row of the band's first row
+            above (bytes):      the cell codes of the maze row above the
+                                band; empty for the first band
+            below (bytes):      likewise, the row below the band
+            tile_size (int):    the number of rows and columns of a tile
+            ends (list):        the (row, col) of the start and destination,
+                                as far as they are known
+            graph (dict):       the boundary graph, as a dict of edge
+                                weights by (row, col) for each (row, col);
+                                the band's edges are added to it
+        """
+        cells = band.cells
+        cols = band.cols
+        size = len(cells)
+        sides = band.path_sides()
+        terminal = bytearray(size)
+        links = []
+        for row, col in ends:
+            if top <= row < top + band.rows:
+                terminal[(row - top) * cols + col] = 1
+        # cut the band into tiles, and note where paths cross between them
+        for col in range(tile_size - 1, cols - 1, tile_size):
+            for i in range(col, size, cols):
+                if sides[i] & EAST and cells[i] != WALL:
+                    terminal[i] = terminal[i + 1] = 1
+                    links.append((i, i + 1))
+                sides[i] &= ~EAST
+                sides[i + 1] &= ~WEST
+        bottom = size - cols
+        for col in range(min(cols, len(above))):
+            if above[col] != WALL and cells[col] != WALL:
+                terminal[col] = 1
+                links.append((col - cols, col))
+        for col in range(min(cols, len(below))):
+            if below[col] != WALL and cells[bottom + col] != WALL:
+                terminal[bottom + col] = 1
+
+        def node(i):
+            return (top + i // cols, i % cols)
+
+        for a, b in links:
+            graph.setdefault(node(a), {})[node(b)] = 1
+            graph.setdefault(node(b), {})[node(a)] = 1
+
+        # fill in the dead ends, as fill_in_dead_ends() does, but keep the
+        # terminals however few paths they have
+        steps = {NORTH: (-cols, SOUTH), SOUTH: (cols, NORTH),
+                 EAST: (1, WEST), WEST: (-1, EAST)}
+        work = bytearray(cells)
+        terminals = int.from_bytes(terminal, 'little')
+        flags = ((int.from_bytes(sides.translate(_DEAD_ENDING), 'little') &
+                  int.from_bytes(cells.translate(_OPEN), 'little')) &
+                 ~terminals).to_bytes(size, 'little')
+        stack = []
+        i = flags.find(1)
+        while i != -1:
+            stack.append(i)
+            i = flags.find(1, i + 1)
+        while stack:
+            i = stack.pop()
+            if work[i] == WALL:
+                continue
+            work[i] = WALL
+            for side, (step, back) in steps.items():
+                if sides[i] & side:
+                    j = i + step
+                    sides[j] &= ~back
+                    if not terminal[j] and _DEGREE[sides[j]] < 2:
+                        stack.append(j)
+            sides[i] = 0
+
+        # what is left of each tile is corridors between the terminals and
+        # the junctions; follow each one from its ends
+        flags = ((int.from_bytes(sides.translate(_BRANCHING), 'little') |
+                  terminals) &
+                 int.from_bytes(work.translate(_OPEN), 'little')
+                 ).to_bytes(size, 'little')
+        i = flags.find(1)
+        while i != -1:
+            a = node(i)
+            for side, (step, back) in steps.items():
+                if not sides[i] & side:
+                    continue
+                j = i + step
+                length = 1
+                while not flags[j]:
+                    step, back = steps[sides[j] & ~back]
+                    j += step
+                    length += 1
+                b = node(j)
+                if j != i and graph.setdefault(a, {}).get(b, length) >= length:
+                    graph[a][b] = length
+            i = flags.find(1, i + 1)
+
+    @staticmethod
+    def _astar(graph, source, target):
+        """A* search of solve_tiled()'s boundary graph.
+
+        Every edge is at least as long as the number of rows and columns
+        between its ends, so that distance to the target never overestimates
+        and the first path to reach the target is a shortest one.
+
+        Args:
+            graph (dict):       as _band_graph() builds it
+            source (tuple):     (row, col) of the start
+            target (tuple):     (row, col) of the destination
+
+        Returns:
+            route (list):   the (row, col) nodes from source to target, or
+                            None if there is no path
+            length (int):   the number of steps along the route
+        """
+        def estimate(node):
+            return abs(node[0] - target[0]) + abs(node[1] - target[1])
+
+        distances = {source: 0}
+        parents = {source: source}
+        heap = [(estimate(source), 0, source)]
+        while heap:
+            _, distance, node = heapq.heappop(heap)
+            if node == target:
+                route = [node]
+                while node != source:
+                    node = parents[node]
+                    route.append(node)
+                route.reverse()
+                return route, distance
+            if distance > distances[node]:
+                continue
+            for neighbour, weight in graph.get(node, {}).items():
+                step = distance + weight
+                if step < distances.get(neighbour, step + 1):
+                    distances[neighbour] = step
+                    parents[neighbour] = node
+                    heapq.heappush(heap,
+                                   (step + estimate(neighbour), step,
+                                    neighbour))
+        return None, None
+
+    def _tile_path(self, band, top, tile_size, a, b):
+        """Return a shortest path between two tiles of the same tile.
+
+        Args:
+            band:               a Grid of the band the tile is in
+            top (int):          the maze row of the band's first row
+            tile_size (int):    the number of rows and columns of a tile
+            a, b (tuple):       (row, col) of the ends of the path
+
+        Returns:
+            path (list):    (row, col) of each tile from a to b
+        """
+        left = a[1] // tile_size * tile_size
+        right = min(left + tile_size, band.cols)
+        width = right - left
+        tile = Grid(band.rows, width, bytearray(b''.join(
+            band.cells[start + left:start + right]
+            for start in range(0, len(band.cells), band.cols))))
+        target = tile.index(b[0] - top, b[1] - left)
+        parents = self._bfs(tile, tile.index(a[0] - top, a[1] - left), target)
+        return [(top + i // width, left + i % width)
+                for i in self._trace(parents, target)]
+
+    def query(self, src, dst):
+        """Return a shortest path between two tiles of the original maze.
+
+        The breadth-first search tree from each source is cached, up to
+        query_cache_bytes, so another query from the same source only
+        follows the tree back from its destination.
+
+        Args:
+            src (tuple):    (row, col) of the tile to start from
+            dst (tuple):    (row, col) of the tile to reach
+
+        Returns:
+            path (list):    (row, col) tuples from src to dst, both included;
+                            its length less one is the distance
+            None:           if there is no path, or src or dst is a wall
+        """
+        return self._query(self._tile(src), self._tile(dst))
+
+    def query_many(self, pairs):
+        """Return a shortest path for each pair of tiles, as query() does.
+
+        The pairs are answered source by source, so each source is searched
+        at most once, even when the cache cannot hold every tree.
+
+        Args:
+            pairs:          (src, dst) pairs of (row, col) tuples
+
+        Returns:
+            paths (list):   a path, or None, for each pair, in order
+        """
+        by_source = {}
+        for k, (src, dst) in enumerate(pairs):
+            by_source.setdefault(self._tile(src), []).append(
+                (k, self._tile(dst)))
+        paths = [None] * sum(len(dsts) for dsts in by_source.values())
+        for source, dsts in by_source.items():
+            if self.original_maze.cells[source] == WALL:
+                continue
+            parents = self._tree(source)
+            for k, target in dsts:
+                paths[k] = self._query(source, target, parents)
+        return paths
+
+    def nearest(self, sources=None, targets=None):
+        """Return a shortest path from any of the sources to any target.
+
+        A single breadth-first search is made from all the sources at once,
+        and it stops at the first target it comes to, however many targets
+        there are. Load a maze with several destinations, and verify it with
+        verify_maze(multiple=True), to find the nearest exit.
+
+        Keyword Args:
+            sources:        (row, col) tiles to start from; every start tile
+                            of the maze by default
+            targets:        (row, col) tiles to reach; every destination tile
+                            of the maze by default
+
+        Returns:
+            path (list):    (row, col) tuples from the nearest source to the
+                            nearest target, both included
+            None:           if no target can be reached
+        """
+        maze = self.original_maze
+        if sources is None:
+            sources = maze.find(START)
+        else:
+            sources = [self._tile(tile) for tile in sources]
+        if targets is None:
+            targets = maze.find(DEST)
+        else:
+            targets = [self._tile(tile) for tile in targets]
+        is_target = bytearray(len(maze.cells))
+        for target in targets:
+            is_target[target] = 1
+        sources = [source for source in sources if maze.cells[source] != WALL]
+        parents, reached = self._search(maze, sources, is_target)
+        if reached is None:
+            return None
+        return [divmod(i, maze.cols) for i in self._trace(parents, reached)]
+
+    def _tile(self, tile):
+        """Return the flat index of a (row, col) tile of the original maze."""
+        row, col = tile
+        maze = self.original_maze
+        if not (0 <= row < maze.rows and 0 <= col < maze.cols):
+            raise IndexError('tile {} is off the maze'.format(tile))
+        return maze.index(row, col)
+
+    def _query(self, source, target, parents=None):
+        """Return the path between two flat indices as query() does."""
+        maze = self.original_maze
+        if WALL in (maze.cells[source], maze.cells[target]):
+            return None
+        if parents is None:
+            parents = self._tree(source)
+        if parents[target] == -1:
+            return None
+        return [divmod(i, maze.cols) for i in self._trace(parents, target)]
+
+    def _tree(self, source):
+        """Return the search tree from a tile, from the cache if it is there.
+
+        Trees are evicted least recently used first to keep them under
+        query_cache_bytes; a tree bigger than that is not kept at all. The
+        cache is emptied when the maze is not the one the trees were searched
+        on; as in _cached(), the maze is hashed afresh every time, so that
+        goes for a maze changed in place too.
+        """
+        maze_hash = self._maze_hash().digest()
+        if self._trees_maze != maze_hash:
+            self._trees.clear()
+            self._trees_bytes = 0
+            self._trees_maze = maze_hash
+        parents = self._trees.get(source)
+        if parents is not None:
+            self._trees.move_to_end(source)
+            return parents
+        parents = self._bfs(self.original_maze, source)
+        size = parents.itemsize * len(parents)
+        if size <= self.query_cache_bytes:
+            while self._trees_bytes + size > self.query_cache_bytes:
+                _, old = self._trees.popitem(last=False)
+                self._trees_bytes -= old.itemsize * len(old)
+            self._trees[source] = parents
+            self._trees_bytes += size
+        return parents
+
+    def _cached(self, mode, compute, graph=False):
+        """Return a result for the loaded maze, from the cache if it has it.
+
+        Results are keyed by a hash of the maze's cell codes, its start and
+        destination, and mode. The maze is hashed afresh on every lookup, so
+        a maze changed in place (by insert_char(), or through a Grid given
+        to set_maze()) never gets the results of what it was before; the
+        hash runs in C, and is cheap next to any solve.
+
+        Args:
+            mode (tuple):       what the result is and how it was worked out
+            compute:            a function that works out the result
+
+        Keyword Args:
+            graph (bool):       the result is a graph, which is only cached if
+                                the cache's graphs is set
+
+        Returns:
+            the result
+        """
+        cache = self.cache
+        if cache is None or (graph and not cache.graphs):
+            return compute()
+        key = self._maze_hash()
+        key.update(repr((self.S_row, self.S_col, self.D_row, self.D_col,
+                         mode)).encode('ascii'))
+        key = key.hexdigest()
+        result = cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = compute()
+            cache.put(key, result)
+        return result
+
+    def _maze_hash(self):
+        """Return a blake2b hash of the loaded maze's cells and dimensions."""
+        maze = self.original_maze
+        maze_hash = hashlib.blake2b(maze.cells, digest_size=20)
+        maze_hash.update(struct.pack('<QQ', maze.rows, maze.cols))
+        return maze_hash
+
+    def _show_solution(self, solution, print_solution, return_solution):
+        """Print and/or return a solution marked on the maze."""
 
         if print_solution:
             for row in solution:
-                print(''.join(row), end='\n')
+                print(row, end='\n')
 
         if return_solution:
             return solution
 
+
+# Each worker process of solve_maze() keeps its own solver for the maze, so
+# the maze is sent to the worker once rather than with every attempt.
+_worker_solver = None
+
+
+def _init_worker(state):
+    """Set up the solver of a solve_maze() worker process."""
+    global _worker_solver
+    _worker_solver = MazeSolver()
+    _worker_solver.__dict__.update(state)
+
+
+def _run_attempt(i, seed, fill, deadline, trace):
+    """Make one solve_maze() attempt in a worker process.
+
+    Returns:
+        attempt:    as MazeSolver._attempt() returns it
+        stats:      a SolverStats of just this attempt, or None if the
+                    solver keeps no stats
+    """
+    stats = _worker_solver.stats
+    if stats is None:
+        return _worker_solver._attempt(i, seed, fill, deadline, trace), None
+    stats.clear()
+    stats._start_attempt()
+    attempt = _worker_solver._attempt(i, seed, fill, deadline, trace)
+    stats._end_attempt()
+    return attempt, stats
+
+
+def _solve_file(filename, method, cache_directory):
+    """Load, verify and solve one maze file for the batch command.
+
+    Anything the solver prints is captured and dropped. A maze that
+    verify_maze() rejects is invalid, and what it prints about it becomes
+    the file's error. Files ending in .maze are loaded with load_maze(), and
+    any other file with get_maze().
+
+    Returns:
+        result (dict):  file, status ('solved', 'no path', 'invalid' or
+                        'error'), length (the number of path tiles between
+                        start and destination), timings in seconds for each
+                        stage reached, and error
+    """
+    result = {'file': filename, 'status': 'error', 'length': None,
+              'timings': {}, 'error': None}
+    ms = MazeSolver()
+    if cache_directory is not None:
+        ms.cache = SolutionCache(cache_directory)
+    printed = io.StringIO()
+    stage = 'load'
+    try:
+        with redirect_stdout(printed):
+            start = time.perf_counter()
+            if filename.endswith('.maze'):
+                ms.load_maze(filename)
+            else:
+                ms.get_maze(filename)
+            result['timings']['load'] = time.perf_counter() - start
+
+            stage = 'verify'
+            start = time.perf_counter()
+            valid = ms.verify_maze(return_maze=True) is not None
+            result['timings']['verify'] = time.perf_counter() - start
+            if not valid:
+                # verify_maze() only says what is wrong when it is not
+                # asked for the maze
+                complaint = io.StringIO()
+                with redirect_stdout(complaint):
+                    ms.verify_maze()
+                result['status'] = 'invalid'
+                result['error'] = ' '.join(complaint.getvalue().split())
+                return result
+
+            stage = 'solve'
+            start = time.perf_counter()
+            if method == 'graph':
+                ms.to_graph(contract=True)
+                try:
+                    solution = ms.solve_graph(print_solution=False,
+                                              return_solution=True)
+                except (nx.NetworkXNoPath, nx.NodeNotFound):
+                    # start and destination are in different pieces of
+                    # the graph
+                    solution = None
+            else:
+                solution = ms.solve_grid(
+                    print_solution=False, return_solution=True,
+                    bidirectional=method == 'bidirectional')
+            result['timings']['solve'] = time.perf_counter() - start
+    except Exception as error:
+        result['error'] = '{} failed: {}: {}'.format(
+            stage, type(error).__name__, error)
+        return result
+    if solution is None:
+        result['status'] = 'no path'
+    else:
+        result['status'] = 'solved'
+        result['length'] = solution.count(BLAZE)
+    return result
+
+
+def _batch(args):
+    """Solve every maze file in a directory; see main()."""
+    filenames = sorted([filename for filename in
+                        glob.glob(os.path.join(args.directory, args.pattern))
+                        if os.path.isfile(filename)])
+    try:
+        return _run_batch(filenames, args)
+    except BrokenPipeError:
+        # whatever was reading the lines went away, as head does once it
+        # has enough; stop quietly, without another error on the way out
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+def _run_batch(filenames, args):
+    """Solve maze files with a pool of workers, printing a line for each.
+
+    Only as many files as there are workers are handed to the pool at a
+    time, so when a worker dies, the files that might have killed it are
+    the ones in hand. Each of those is then solved again in a pool of its
+    own, so that only the file that really kills a worker is reported as
+    an error, and the rest of the files go on to a fresh pool.
+
+    Args:
+        filenames (list):   the maze files, in the order to solve them
+        args:               see main()
+
+    Returns:
+        status (int):       see main()
+    """
+    workers = args.workers or os.cpu_count() or 1
+    todo = deque(filenames)
+    failed = 0
+    while todo:
+        suspects = []
+        with futures.ProcessPoolExecutor(workers) as pool:
+            pending = {}
+            while (todo or pending) and not suspects:
+                while todo and len(pending) < workers:
+                    filename = todo.popleft()
+                    pending[pool.submit(_solve_file, filename, args.method,
+                                        args.cache)] = filename
+                done, _ = futures.wait(pending,
+                                       return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    filename = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        suspects.append(filename)
+                        continue
+                    except Exception as error:
+                        # its result could not be sent back
+                        result = _error_result(filename, error)
+                    failed += _print_result(result)
+            # a worker died: every file still in hand is a suspect
+            suspects.extend(pending.values())
+        for filename in sorted(suspects):
+            with futures.ProcessPoolExecutor(1) as pool:
+                future = pool.submit(_solve_file, filename, args.method,
+                                     args.cache)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    result = _error_result(filename, error)
+            failed += _print_result(result)
+    return 1 if failed else 0
+
+
+def _error_result(filename, error):
+    """Return the JSON record of a file whose worker failed."""
+    return {'file': filename, 'status': 'error', 'length': None,
+            'timings': {},
+            'error': '{}: {}'.format(type(error).__name__, error)}
+
+
+def _print_result(result):
+    """Print a file's JSON record, and return whether the file failed."""
+    print(json.dumps(result), flush=True)
+    return result['status'] in ('invalid', 'error')
+
+
+def main(argv=None):
+    """Run the command line interface.
+
+    python -m MazeSolver batch <dir> solves every maze in a directory with
+    a pool of worker processes, and prints a JSON line for each maze as it
+    is finished (see _solve_file()). A maze that fails to load, verify or
+    solve is reported in its line, and the rest of the batch carries on.
+
+    Keyword Args:
+        argv (list):    the arguments, without the program name; defaults
+                        to sys.argv[1:]
+
+    Returns:
+        status (int):   the exit status; 1 if any maze failed
+    """
+    parser = argparse.ArgumentParser(prog='python -m MazeSolver',
+                                     description='Solve maze files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    batch = commands.add_parser(
+        'batch', help='solve every maze in a directory',
+        description='Solve every maze in a directory, printing a JSON line '
+                    'for each as it is finished.')
+    batch.add_argument('directory', help='the directory of maze files')
+    batch.add_argument('--pattern', default='*.txt',
+                       help='which files to solve (default: %(default)s)')
+    batch.add_argument('--workers', type=int, default=None,
+                       help='the number of worker processes (default: one '
+                            'per CPU)')
+    batch.add_argument('--method', default='grid',
+                       choices=['grid', 'bidirectional', 'graph'],
+                       help='solve with solve_grid(), solve_grid('
+                            'bidirectional=True) or a contracted graph and '
+                            'solve_graph() (default: %(default)s)')
+    batch.add_argument('--cache', metavar='DIR', default=None,
+                       help='keep solutions in a SolutionCache in DIR')
+    args = parser.parse_args(argv)
+    return _batch(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""Benchmarks for MazeSolver.
+
+Times the main stages of solving (loading, verifying, filling in
+dead-ends, the maze walker and the networkx graph) on generated mazes of
+several sizes and layouts. Every maze comes from a fixed seed, so a run
+times the same mazes every time.
+
+    python MazeSolver_benchmarks.py
+    python MazeSolver_benchmarks.py --sizes 10 100 --topologies perfect
+    python MazeSolver_benchmarks.py --save-baseline
+
+Results are written as JSON, and compared with a stored baseline from an
+earlier run on the same machine; any benchmark that has slowed down by
+more than the tolerance is reported, and the run exits with status 1.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from contextlib import redirect_stdout
+from MazeSolver import MazeSolver
+from MazeGenerator import MazeGenerator
+
+SIZES = [10, 100, 1000, 4000]
+TOPOLOGIES = ['perfect', 'braided', 'rooms', 'wide']
+RESULTS = 'benchmark_results.json'
+BASELINE = 'benchmark_baseline.json'
+
+
+def _generator(rng, braid=0.0):
+    """Return a MazeGenerator that draws from rng.
+
+    The mazes of a topology are drawn from one random.Random, so they are
+    the same from one version of the suite to the next.
+    """
+    generator = MazeGenerator(braid=braid)
+    generator.rng = rng
+    return generator
+
+
+def perfect(size, rng):
+    """Return a perfect maze (one path between any two tiles) of size rows.
+
+    The maze is carved by MazeGenerator's recursive backtracker, so it has a
+    border of wall and corridors one tile wide. Its start is at the top left
+    and its destination at the bottom right.
+
+    Args:
+        size (int):     the number of rows and columns
+        rng:            a random.Random
+
+    Returns:
+        maze (list):    rows of '0' (wall) and '1' (path), with an 'S' and
+                        a 'D'
+    """
+    return list(_generator(rng).lines(size, size))
+
+
+def braided(size, rng):
+    """Return a perfect maze with every dead-end knocked through.
+
+    Each dead-end room has the wall to one of its walled-off neighbours
+    removed, so the maze is full of loops.
+    """
+    return list(_generator(rng, braid=1.0).lines(size, size))
+
+
+def rooms(size, rng):
+    """Return a perfect maze with open rectangular rooms cleared in it.
+
+    The rooms are a tenth of the size in number and up to an eighth of it
+    on a side, so they grow with the maze, unlike MazeGenerator's rooms.
+    """
+    cells = [bytearray(row, 'ascii') for row in perfect(size, rng)]
+    for _ in range(max(size // 10, 1)):
+        height = rng.randint(1, max(size // 8, 1))
+        width = rng.randint(1, max(size // 8, 1))
+        top = rng.randint(1, max(size - height - 1, 1))
+        left = rng.randint(1, max(size - width - 1, 1))
+        for row in range(top, min(top + height, size - 1)):
+            for col in range(left, min(left + width, size - 1)):
+                if cells[row][col] == ord('0'):
+                    cells[row][col] = ord('1')
+    return [row.decode('ascii') for row in cells]
+
+
+def wide(size, rng, width=3):
+    """Return a perfect maze with corridors (and walls) width tiles wide.
+
+    The maze is a perfect maze of a width'th of the size with every tile
+    blown up to a block, so it is about size rows, and at least 5 * width.
+    """
+    small = perfect(max(size // width, 5), rng)
+    maze = []
+    for row in small:
+        wide_row = ''.join(char * width for char in row)
+        maze.extend([wide_row] * width)
+    # one start and one destination: the top left tile of their blocks
+    maze = [row.replace('S', '1').replace('D', '1') for row in maze]
+    for char in 'SD':
+        row = [char in small_row for small_row in small].index(True)
+        col = small[row].index(char) * width
+        row *= width
+        maze[row] = maze[row][:col] + char + maze[row][col + 1:]
+    return maze
+
+
+GENERATORS = {'perfect': perfect, 'braided': braided, 'rooms': rooms,
+              'wide': wide}
+
+
+def _loaded(filename):
+    """Return a solver with the maze loaded and verified."""
+    ms = MazeSolver()
+    ms.get_maze(filename)
+    ms.verify_maze()
+    return ms
+
+
+def _get_maze(filename):
+    ms = MazeSolver()
+    return lambda: ms.get_maze(filename)
+
+
+def _verify_maze(filename):
+    ms = MazeSolver()
+    ms.get_maze(filename)
+    return ms.verify_maze
+
+
+def _fill_in_dead_ends(filename):
+    ms = _loaded(filename)
+    maze = ms.original_maze.copy()
+    return lambda: ms.fill_in_dead_ends(maze)
+
+
+def _solve_maze(filename):
+    ms = _loaded(filename)
+    return lambda: ms.solve_maze(n=3, seed=0, trace='none')
+
+
+def _solve_maze_bfs_tree(filename):
+    ms = _loaded(filename)
+    return lambda: ms.solve_maze(n=1, trace='none', strategy='bfs-tree')
+
+
+def _solve_graph(filename):
+    ms = _loaded(filename)
+
+    def solve():
+        ms.to_graph()
+        ms.solve_graph(print_solution=False)
+    return solve
+
+
+# each benchmark's setup takes a maze file and returns the function to time;
+# it is run up to the largest size given (if any), and on the topologies
+# given (if any). The random walker can run off into open areas (see Known
+# Issues in the README), so it is only run on mazes of corridors.
+BENCHMARKS = {'get_maze': (_get_maze, None, None),
+              'verify_maze': (_verify_maze, None, None),
+              'fill_in_dead_ends': (_fill_in_dead_ends, None, None),
+              'solve_maze': (_solve_maze, 100, ['perfect', 'braided']),
+              'solve_maze bfs-tree': (_solve_maze_bfs_tree, 1000, None),
+              'to_graph+solve_graph': (_solve_graph, 1000, None)}
+
+
+def run(sizes=SIZES, topologies=TOPOLOGIES, benchmarks=None, repeat=3,
+        seed=0, log=sys.stderr):
+    """Run the benchmarks and return their results.
+
+    Each benchmark is set up afresh and timed repeat times, and the fastest
+    time is kept; the slower runs are those the machine was busy for.
+
+    Keyword Args:
+        sizes (list):       the sizes (rows and columns) of the mazes
+        topologies (list):  the layouts of the mazes, from GENERATORS
+        benchmarks (list):  the benchmarks to run, from BENCHMARKS; all of
+                            them by default
+        repeat (int):       how many times to time each benchmark
+        seed (int):         the seed every maze is generated from
+        log:                a file to report progress to
+
+    Returns:
+        results (list):     a dict for each benchmark, topology and size,
+                            with its fastest time and all of its times, in
+                            seconds
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for topology in topologies:
+            for size in sizes:
+                maze = GENERATORS[topology](size, random.Random(seed))
+                filename = os.path.join(directory, '{}_{}.txt'.format(
+                    topology, size))
+                with open(filename, 'w') as f:
+                    f.write('\n'.join(maze) + '\n')
+                for name in benchmarks or BENCHMARKS:
+                    setup, largest, layouts = BENCHMARKS[name]
+                    if ((largest is not None and size > largest) or
+                            (layouts is not None and topology not in layouts)):
+                        continue
+                    times = []
+                    for _ in range(repeat):
+                        # the solver's progress output is not timed
+                        with redirect_stdout(io.StringIO()):
+                            timed = setup(filename)
+                            start = time.perf_counter()
+                            timed()
+                            times.append(time.perf_counter() - start)
+                    results.append({'benchmark': name, 'topology': topology,
+                                    'size': size, 'seconds': min(times),
+                                    'times': times})
+                    print('{:<22}{:<9}{:>6}{:>12.6f}s'.format(
+                        name, topology, size, min(times)), file=log)
+    return results
+
+
+def compare(results, baseline, tolerance=1.5, noise=0.001):
+    """Return the benchmarks that are slower than in a baseline.
+
+    Args:
+        results (list):     as run() returns them
+        baseline (list):    results of an earlier run
+
+    Keyword Args:
+        tolerance (float):  how many times slower a benchmark may be
+        noise (float):      how many seconds slower a benchmark may be
+                            anyway; the fastest ones vary by more than
+                            tolerance from run to run
+
+    Returns:
+        regressions (list): (result, baseline seconds) for each benchmark
+                            more than tolerance times and noise seconds
+                            slower
+    """
+    before = {(result['benchmark'], result['topology'], result['size']):
+              result['seconds'] for result in baseline}
+    regressions = []
+    for result in results:
+        key = (result['benchmark'], result['topology'], result['size'])
+        if (key in before and result['seconds'] > before[key] * tolerance
+                and result['seconds'] > before[key] + noise):
+            regressions.append((result, before[key]))
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line.
+
+    Returns:
+        status (int):   1 if any benchmark regressed, else 0
+    """
+    parser = argparse.ArgumentParser(description='Benchmark MazeSolver.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='maze sizes (default: %(default)s)')
+    parser.add_argument('--topologies', nargs='+', default=TOPOLOGIES,
+                        choices=TOPOLOGIES,
+                        help='maze layouts (default: all)')
+    parser.add_argument('--benchmarks', nargs='+', default=None,
+                        choices=list(BENCHMARKS),
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='times to run each (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='maze seed (default: %(default)s)')
+    parser.add_argument('--output', default=RESULTS,
+                        help='results file (default: %(default)s)')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='baseline file (default: %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='slow-down allowed before a benchmark counts as '
+                             'a regression (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.topologies, args.benchmarks, args.repeat,
+                  args.seed)
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'seed': args.seed, 'repeat': args.repeat,
+              'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}; run with --save-baseline to store '
+              'one.'.format(args.baseline), file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance)
+    for result, seconds in regressions:
+        print('REGRESSION: {} on a {} maze of size {} took {:.6f}s, '
+              '{:.1f} times the baseline {:.6f}s'.format(
+                  result['benchmark'], result['topology'], result['size'],
+                  result['seconds'], result['seconds'] / seconds, seconds),
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
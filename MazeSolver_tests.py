@@ -1,7 +1,32 @@
 #!/usr/bin/env python
 
+import io
+import os
+import json
+import random
+import shutil
+import subprocess
+import sys
+import multiprocessing
+import tempfile
 import unittest
-from MazeSolver import MazeSolver 
+from unittest import mock
+import networkx as nx
+import MazeSolver_benchmarks
+from contextlib import redirect_stdout
+from MazeGenerator import MazeGenerator
+from MazeSolver import MazeSolver, Grid, SolutionCache, SolverStats, main
+from MazeSolver import PATH, WALL, START, DEST, BLAZE
+from MazeSolver import NORTH, SOUTH, EAST, WEST
+from MazeSolver import _solve_file, _Paths
+
+
+def _crashing_solve_file(filename, method, cache_directory):
+    """Kill the batch worker on crash.txt; solve other files as usual."""
+    if filename.endswith('crash.txt'):
+        os._exit(1)
+    return _solve_file(filename, method, cache_directory)
+
 
 class MazeSolverTestCase(unittest.TestCase):
     """Tests for MazeSolver class."""
@@ -27,6 +52,104 @@ class MazeSolverTestCase(unittest.TestCase):
         test_maze = self.ms.get_maze(filename, return_maze=True)
         self.assertEqual(correct_maze, test_maze)
 
+    def test_get_maze_line_endings(self):
+        """CRLF, ragged and trailing-space files load like plain ones."""
+
+        filename = "test_mazes/test_maze_001.txt"
+        plain = self.ms.get_maze(filename, return_maze=True)
+        with open(filename) as f:
+            rows = f.read().splitlines()
+        variants = ['\r\n'.join(rows) + '\r\n',
+                    '\n'.join(rows),
+                    '\n'.join(row + '  ' for row in rows) + '\n',
+                    '\n'.join(rows[:-1] + [rows[-1][:-2]]) + '\n']
+        for text in variants:
+            with tempfile.NamedTemporaryFile('wb', suffix='.txt',
+                                             delete=False) as f:
+                f.write(text.encode())
+            try:
+                maze = MazeSolver().get_maze(f.name, return_maze=True)
+            finally:
+                os.remove(f.name)
+            self.assertEqual(plain, maze)
+
+    def test_get_maze_unknown_character(self):
+        """A character that does not fit in a cell is turned down."""
+
+        filename = "test_mazes/test_maze_001.txt"
+        with open(filename) as f:
+            rows = f.read().splitlines()
+        rows[2] = rows[2][:3] + '\u2603' + rows[2][4:]
+        with tempfile.NamedTemporaryFile('wb', suffix='.txt',
+                                         delete=False) as f:
+            f.write('\n'.join(rows).encode())
+        try:
+            with self.assertRaisesRegex(ValueError, 'row 2, column 3'):
+                MazeSolver().get_maze(f.name)
+        finally:
+            os.remove(f.name)
+
+    def test_save_maze(self):
+        """A maze saved in the binary format loads back the same."""
+
+        for number in (1, 17, 105):
+            filename = "test_mazes/test_maze_{:03}.txt".format(number)
+            maze = self.ms.get_maze(filename, return_maze=True)
+            S_D = (self.ms.S_row, self.ms.S_col, self.ms.D_row, self.ms.D_col)
+            with tempfile.NamedTemporaryFile(suffix='.maze',
+                                             delete=False) as f:
+                binary_filename = f.name
+            try:
+                self.ms.convert_maze(filename, binary_filename)
+                # a 30 byte header, then a bit per tile
+                self.assertEqual(os.path.getsize(binary_filename),
+                                 30 + (maze.rows * maze.cols + 7) // 8)
+                ms = MazeSolver()
+                self.assertEqual(maze, ms.load_maze(binary_filename,
+                                                    return_maze=True))
+                self.assertEqual(S_D, (ms.S_row, ms.S_col, ms.D_row, ms.D_col))
+            finally:
+                os.remove(binary_filename)
+        with self.assertRaises(ValueError):
+            self.ms.load_maze(filename)
+
+    def test_grid(self):
+        """The grid stores one code per cell and renders back to strings."""
+
+        maze = [self.wall * 4,
+                self.wall + self.start + self.path + self.wall,
+                self.wall * 3]
+        grid = Grid.from_strings(maze)
+        # short rows are padded with wall
+        self.assertEqual((grid.rows, grid.cols), (3, 4))
+        self.assertEqual(grid.get(1, 1), START)
+        self.assertEqual(grid.get(2, 3), WALL)
+        grid.set(1, 2, WALL)
+        self.assertEqual(grid[1], self.wall + self.start + self.wall * 2)
+        # copies are independent
+        copy = grid.copy()
+        copy.set(1, 2, PATH)
+        self.assertNotEqual(grid, copy)
+        padded = grid.pad(top=1, left=1)
+        self.assertEqual((padded.rows, padded.cols), (4, 5))
+        self.assertEqual(padded.get(2, 2), START)
+
+    def test_path_sides(self):
+        """Flags the open sides of every cell, as get_paths() finds them."""
+
+        filename = "test_mazes/test_maze_102.txt"
+        self.ms.get_maze(filename)
+        maze = self.ms.original_maze
+        sides = maze.path_sides()
+        for row in range(maze.rows):
+            for col in range(maze.cols):
+                paths = self.ms.get_paths(maze, row, col)
+                open_sides = sides[maze.index(row, col)]
+                self.assertEqual(paths, (bool(open_sides & NORTH),
+                                         bool(open_sides & SOUTH),
+                                         bool(open_sides & EAST),
+                                         bool(open_sides & WEST)))
+
     def test_verify_maze(self):
         """The maze has the correct format."""
 
@@ -88,6 +211,9 @@ class MazeSolverTestCase(unittest.TestCase):
         self.ms.get_maze(filename)
         test_maze = self.ms.verify_maze(return_maze=True)
         self.assertEqual(correct_maze, test_maze)
+        # the start and destination move with the walls added
+        self.assertEqual((self.ms.S_row, self.ms.S_col), (4, 2))
+        self.assertEqual((self.ms.D_row, self.ms.D_col), (2, 6))
 
         # test missing destination
         filename = "test_mazes/test_maze_007.txt"
@@ -203,6 +329,10 @@ class MazeSolverTestCase(unittest.TestCase):
                         self.wall*7]
         test_maze = self.ms.insert_char(maze, 2, 1, self.path)
         self.assertEqual(correct_maze, test_maze)
+        # a character that does not fit in a cell is turned down
+        with self.assertRaises(ValueError):
+            self.ms.insert_char(maze, 2, 1, '\u2603')
+        self.assertEqual(correct_maze, maze)
 
     def test_get_paths(self):
         """Returns the correct open paths at a position in the maze."""
@@ -371,6 +501,67 @@ class MazeSolverTestCase(unittest.TestCase):
         num_dead_ends = self.ms.count_dead_ends(maze)
         self.assertTrue(num_dead_ends == 0)
 
+        # a stretch of path cut off from everything else is filled in to the
+        # last tile in row-by-row order
+        maze = Grid.from_strings([self.wall*5,
+                                  self.wall + self.path*3 + self.wall,
+                                  self.wall*5])
+        maze = self.ms.fill_in_dead_ends(maze)
+        correct_maze = [self.wall*5,
+                        self.wall*3 + self.path + self.wall,
+                        self.wall*5]
+        self.assertEqual(correct_maze, maze)
+        # the same goes for a maze one tile wide
+        maze = Grid.from_strings([self.wall, self.path, self.path, self.path,
+                                  self.wall])
+        maze = self.ms.fill_in_dead_ends(maze)
+        correct_maze = [self.wall, self.wall, self.wall, self.path, self.wall]
+        self.assertEqual(correct_maze, maze)
+
+    def test_fill_in_dead_ends_bulk(self):
+        """The bulk fill leaves the same dead-ends as the worklist fill."""
+
+        for filename in ["test_mazes/test_maze_100.txt",
+                         "test_mazes/test_maze_102.txt",
+                         "test_mazes/test_maze_105.txt"]:
+            maze = self.ms.get_maze(filename, return_maze=True)
+            correct_maze = self.ms.fill_in_dead_ends(maze.copy())
+            test_maze = self.ms.fill_in_dead_ends(maze, method='bulk')
+            self.assertEqual(correct_maze, test_maze)
+        # start and destination are never filled in
+        self.assertEqual(self.ms.count_char(test_maze, self.start), 1)
+        self.assertEqual(self.ms.count_char(test_maze, self.dest), 1)
+
+    def test_fill_in_new_dead_ends(self):
+        """Filling in after a new wall matches a fill of the whole maze."""
+
+        maze = self.ms.get_maze("test_mazes/test_maze_105.txt",
+                                return_maze=True)
+        maze = self.ms.fill_in_dead_ends(maze)
+        for wall in maze.find(PATH):
+            test_maze = maze.copy()
+            paths = _Paths(test_maze)
+            test_maze.cells[wall] = WALL
+            paths.wall([wall])
+            correct_maze = self.ms.fill_in_dead_ends(test_maze.copy())
+            walled = []
+            self.ms._fill_in_new_dead_ends(test_maze, paths, wall, walled)
+            self.assertEqual(correct_maze, test_maze)
+            self.assertEqual(sorted(walled + [wall]),
+                             test_maze.changes(maze.cells))
+
+    def test_fill_in_dead_ends_walled(self):
+        """Both fills list exactly the tiles they wall off."""
+
+        maze = self.ms.get_maze("test_mazes/test_maze_105.txt",
+                                return_maze=True)
+        for method in ('worklist', 'bulk'):
+            test_maze = maze.copy()
+            walled = []
+            self.ms.fill_in_dead_ends(test_maze, method=method,
+                                      walled=walled)
+            self.assertEqual(sorted(walled), test_maze.changes(maze.cells))
+
     def test_move_north(self):
         """Correctly moves the maze position north.
         
@@ -478,6 +669,17 @@ class MazeSolverTestCase(unittest.TestCase):
         correct_row, correct_col = (1, 3)
         test_row, test_col = self.ms.take_first_step(row, col, paths, turn)
         self.assertEqual((correct_row, correct_col), (test_row, test_col))
+
+        filename = "test_mazes/test_maze_017.txt"
+        maze = self.ms.get_maze(filename, return_maze=True)
+        paths = self.ms.get_paths(maze, row, col)
+        turn = 'random'
+        # should step east or west, and nowhere else
+        steps = {self.ms.take_first_step(row, col, paths, turn)
+                 for _ in range(50)}
+        open_steps = {step for step, path in zip([(1, 3), (3, 3), (2, 4),
+                                                  (2, 2)], paths) if path}
+        self.assertEqual(open_steps, steps)
         
     def test_take_step(self):
         """Correctly takes a step in the maze."""
@@ -614,6 +816,610 @@ class MazeSolverTestCase(unittest.TestCase):
                         self.wall*7]
         self.assertEqual(correct_maze, test_maze)
 
+    def test_solve_maze_workers(self):
+        """The same seed gives the same solutions with or without workers."""
+
+        filename = "test_mazes/test_maze_102.txt"
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        with redirect_stdout(io.StringIO()):
+            correct_solution = self.ms.solve_maze(n=6, seed=7)
+            correct_lengths = self.ms.solution_lengths
+            correct_steps = self.ms.steps
+            test_solution = self.ms.solve_maze(n=6, seed=7, workers=2)
+        self.assertEqual(correct_solution, test_solution)
+        self.assertEqual(correct_lengths, self.ms.solution_lengths)
+        self.assertEqual(correct_steps, self.ms.steps)
+        self.assertEqual(self.ms.seed, 7)
+
+    def test_solve_maze_breaks(self):
+        """Keeps only the tiles each foray walls off."""
+
+        filename = "test_mazes/test_maze_102.txt"
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        with redirect_stdout(io.StringIO()):
+            self.ms.solve_maze(n=5, seed=3)
+        final_mazes = []
+        for i, deltas in self.ms.breaks:
+            # one array for the first fill and one for each foray
+            self.assertEqual(len(deltas), len(self.ms.steps[i][1]) + 1)
+            maze = self.ms.original_maze.copy()
+            for delta in deltas:
+                for k in delta:
+                    self.assertEqual(maze.cells[k], PATH)
+                    maze.cells[k] = WALL
+            final_mazes.append(maze)
+        # replaying the changes of a solved attempt leaves only its path
+        path_lengths = [maze.count(PATH) for maze in final_mazes]
+        for length in self.ms.solution_lengths:
+            self.assertIn(length, path_lengths)
+
+        with redirect_stdout(io.StringIO()):
+            forays = self.ms.get_forays(0, return_forays=True,
+                                        print_forays=False)
+        self.assertEqual(len(forays), len(self.ms.steps[0][1]))
+        for maze in forays:
+            self.assertGreater(maze.count(BLAZE), 0)
+
+    def test_iter_forays(self):
+        """Yields the same forays that get_forays() prints."""
+
+        filename = "test_mazes/test_maze_102.txt"
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        with redirect_stdout(io.StringIO()):
+            self.ms.solve_maze(n=3, seed=5)
+        for n in range(3):
+            printed = io.StringIO()
+            with redirect_stdout(printed):
+                self.ms.get_forays(n)
+            lines = printed.getvalue().splitlines()
+            rows = self.ms.original_maze.rows
+            correct_forays = [lines[i:i + rows]
+                              for i in range(0, len(lines), rows)]
+            test_forays = [maze.to_strings()
+                           for maze in self.ms.iter_forays(n)]
+            self.assertEqual(correct_forays, test_forays)
+            buffers = []
+            test_forays = []
+            for maze in self.ms.iter_forays(n, reuse=True):
+                buffers.append(maze)
+                test_forays.append(maze.to_strings())
+            self.assertEqual(correct_forays, test_forays)
+            self.assertTrue(all(maze is buffers[0] for maze in buffers))
+
+    def test_solve_maze_bfs_tree(self):
+        """Breaks the loops off a search tree, leaving a shortest path."""
+
+        for filename in ["test_mazes/test_maze_102.txt",
+                         "test_mazes/test_maze_105.txt"]:
+            self.ms.get_maze(filename)
+            self.ms.verify_maze()
+            correct_solution = self.ms.solve_grid(print_solution=False,
+                                                  return_solution=True)
+            with redirect_stdout(io.StringIO()):
+                test_solution = self.ms.solve_maze(strategy='bfs-tree')
+            self.assertEqual(correct_solution, test_solution)
+            self.assertEqual(self.ms.solution_lengths,
+                             [self.ms._optimal_length()])
+            # one attempt, with a foray for every loop
+            self.assertEqual(len(self.ms.steps), 1)
+            with redirect_stdout(io.StringIO()):
+                forays = self.ms.get_forays(0, return_forays=True)
+            self.assertEqual(len(forays), len(self.ms.steps[0][1]))
+            self.assertGreater(len(forays), 0)
+            # replaying every broken loop leaves just the solution's path
+            maze = self.ms.original_maze.copy()
+            for delta in self.ms.breaks[0][1]:
+                for i in delta:
+                    maze.cells[i] = WALL
+            self.assertEqual(maze.find(PATH), test_solution.find(BLAZE))
+
+        with self.assertRaises(ValueError):
+            self.ms.solve_maze(strategy='dfs')
+
+    def test_solve_maze_early_exit(self):
+        """Stops at the first optimal solution, or when time runs out."""
+
+        filename = "test_mazes/test_maze_105.txt"
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        with redirect_stdout(io.StringIO()):
+            self.ms.solve_maze(n=50, seed=7, target='optimal')
+        self.assertLess(len(self.ms.steps), 50)
+        self.assertEqual(self.ms.solution_lengths[-1], 10)
+
+        with redirect_stdout(io.StringIO()):
+            test_solution = self.ms.solve_maze(n=50, max_seconds=0)
+        self.assertIsNone(test_solution)
+        self.assertEqual(self.ms.steps, [])
+
+        # a maze with no loops is solved by the fill alone, which is timed
+        # too
+        self.ms.get_maze("test_mazes/test_maze_001.txt")
+        self.ms.verify_maze()
+        for strategy in ('random', 'bfs-tree'):
+            with redirect_stdout(io.StringIO()):
+                test_solution = self.ms.solve_maze(n=5, max_seconds=0,
+                                                   strategy=strategy)
+            self.assertIsNone(test_solution)
+            self.assertEqual(self.ms.steps, [])
+
+        # an attempt in a worker gives up once solve_maze() stops waiting
+        self.ms._stop = multiprocessing.Event()
+        self.assertIsNotNone(self.ms._attempt(0, 1, 'worklist'))
+        self.ms._stop.set()
+        self.assertIsNone(self.ms._attempt(0, 1, 'worklist'))
+        self.assertIsNone(self.ms._tree_attempt('worklist'))
+
+    def test_solve_maze_trace(self):
+        """Keeps as much of each attempt as the trace level asks for."""
+
+        filename = "test_mazes/test_maze_102.txt"
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        with redirect_stdout(io.StringIO()):
+            correct_solution = self.ms.solve_maze(n=5, seed=3)
+            correct_steps = self.ms.steps
+            correct_lengths = self.ms.solution_lengths
+
+            self.ms.solve_maze(n=5, seed=3, trace='summary')
+            self.assertEqual(self.ms.solution_lengths, correct_lengths)
+            # step counts in place of the steps
+            self.assertEqual(
+                [[i, [[j, len(foray)] for j, foray in forays]]
+                 for i, forays in correct_steps],
+                self.ms.steps)
+            self.assertEqual(self.ms.breaks, [[i, []] for i in range(5)])
+            with self.assertRaises(ValueError):
+                self.ms.get_forays(0)
+
+            test_solution = self.ms.solve_maze(n=5, seed=3, trace='none')
+        self.assertEqual(correct_solution, test_solution)
+        self.assertEqual(self.ms.solution_lengths, [min(correct_lengths)])
+        self.assertEqual(self.ms.steps, [[i, []] for i in range(5)])
+
+    def test_to_graph(self):
+        """Has a node for every open tile and an edge between open tiles."""
+
+        filename = "test_mazes/test_maze_001.txt"
+        self.ms.get_maze(filename)
+        G = self.ms.to_graph(return_graph=True)
+        # 9 path tiles, start and destination
+        self.assertEqual(G.number_of_nodes(), 11)
+        self.assertEqual(G.number_of_edges(), 10)
+        self.assertTrue(G.has_edge((1, 3), (2, 3)))
+        self.assertFalse(G.has_edge((1, 1), (2, 1)))
+        # neighbours are in the order north, west, south, east
+        self.assertEqual(list(G.adj[(1, 3)]), [(1, 2), (2, 3), (1, 4)])
+
+        bare = self.ms.to_graph(return_graph=True, node_attrs=False)
+        self.assertEqual(sorted(G.edges()), sorted(bare.edges()))
+        with self.assertRaises(TypeError):
+            bare.add_node((1, 1), visited=True)
+
+    def test_to_graph_contracted(self):
+        """Corridors become single weighted edges between branches."""
+
+        filename = "test_mazes/test_maze_012.txt"
+        self.ms.get_maze(filename)
+        G = self.ms.to_graph(return_graph=True, contract=True)
+        # four branches, start, destination and a dead-end
+        self.assertEqual(G.number_of_nodes(), 7)
+        self.assertEqual(G[(3, 1)][(3, 4)]['weight'], 3)
+        self.assertEqual(G[(3, 1)][(3, 4)]['cells'], [(3, 2), (3, 3)])
+
+        for number in range(100, 108):
+            filename = "test_mazes/test_maze_{}.txt".format(number)
+            self.ms.get_maze(filename)
+            self.ms.verify_maze()
+            correct_solution = self.ms.solve_grid(print_solution=False,
+                                                  return_solution=True)
+            self.ms.to_graph(contract=True)
+            test_solution = self.ms.solve_graph(print_solution=False,
+                                                return_solution=True)
+            self.assertEqual(correct_solution.count(BLAZE),
+                             test_solution.count(BLAZE))
+
+    def test_solve_grid(self):
+        """Finds a path as short as the networkx shortest path."""
+
+        for number in range(100, 108):
+            filename = "test_mazes/test_maze_{}.txt".format(number)
+            self.ms.get_maze(filename)
+            self.ms.verify_maze()
+            test_solution = self.ms.solve_grid(print_solution=False,
+                                               return_solution=True)
+            # without a graph, solve_graph() falls back to solve_grid()
+            self.assertEqual(test_solution, self.ms.solve_graph(
+                print_solution=False, return_solution=True))
+            self.ms.to_graph()
+            correct_solution = self.ms.solve_graph(print_solution=False,
+                                                   return_solution=True)
+            self.assertEqual(correct_solution.count(BLAZE),
+                             test_solution.count(BLAZE))
+
+    def test_solve_grid_bidirectional(self):
+        """Searching from both ends finds a path just as short."""
+
+        for number in range(100, 109):
+            filename = "test_mazes/test_maze_{}.txt".format(number)
+            self.ms.get_maze(filename)
+            self.ms.verify_maze(multiple=True)
+            correct_solution = self.ms.solve_grid(print_solution=False,
+                                                  return_solution=True)
+            explored = self.ms.explored
+            test_solution = self.ms.solve_grid(print_solution=False,
+                                               return_solution=True,
+                                               bidirectional=True)
+            self.assertEqual(correct_solution.count(BLAZE),
+                             test_solution.count(BLAZE))
+            self.assertLessEqual(self.ms.explored, explored)
+            # without a graph, solve_graph() passes bidirectional on
+            explored = self.ms.explored
+            self.assertEqual(test_solution, self.ms.solve_graph(
+                print_solution=False, return_solution=True,
+                bidirectional=True))
+            self.assertEqual(self.ms.explored, explored)
+
+    def test_solve_tiled(self):
+        """Solving a tile at a time finds a path as short as solve_grid()."""
+
+        for number in range(100, 109):
+            filename = "test_mazes/test_maze_{}.txt".format(number)
+            self.ms.get_maze(filename)
+            correct_solution = self.ms.solve_grid(print_solution=False,
+                                                  return_solution=True)
+            for tile_size in (1, 3, 8, 64):
+                with tempfile.NamedTemporaryFile(suffix='.txt',
+                                                 delete=False) as f:
+                    output = f.name
+                try:
+                    length = self.ms.solve_tiled(filename, output=output,
+                                                 tile_size=tile_size)
+                    with open(output, encoding='utf-8') as f:
+                        test_solution = f.read().splitlines()
+                finally:
+                    os.remove(output)
+                self.assertEqual(length, correct_solution.count(BLAZE))
+                self.assertEqual(len(test_solution), len(correct_solution))
+                # the path may differ, but only by blazing other open tiles
+                for test_row, row in zip(test_solution,
+                                         self.ms.original_maze):
+                    for test_char, char in zip(test_row, row):
+                        if test_char != char:
+                            self.assertEqual(test_char, self.ms.blaze)
+                            self.assertNotEqual(char, self.wall)
+                self.assertEqual(sum(row.count(self.ms.blaze)
+                                     for row in test_solution), length)
+        # without an output file, the solution is printed
+        printed = io.StringIO()
+        with redirect_stdout(printed):
+            self.ms.solve_tiled(filename)
+        self.assertEqual(printed.getvalue().splitlines(), test_solution)
+
+    def test_cache(self):
+        """Solutions and graphs are cached in memory and on disk."""
+
+        filename = "test_mazes/test_maze_105.txt"
+        with tempfile.TemporaryDirectory() as directory:
+            self.ms.cache = SolutionCache(directory, graphs=True)
+            self.ms.get_maze(filename)
+            correct_solution = self.ms.solve_grid(print_solution=False,
+                                                  return_solution=True)
+            self.assertEqual(len(self.ms.cache._memory), 1)
+            self.assertEqual(len(os.listdir(directory)), 1)
+            # a new solver and cache find the solution on disk
+            ms = MazeSolver()
+            ms.cache = SolutionCache(directory, graphs=True)
+            ms.get_maze(filename)
+            ms._grid_path = None
+            self.assertEqual(correct_solution, ms.solve_grid(
+                print_solution=False, return_solution=True))
+            self.assertEqual(self.ms.explored, ms.explored)
+            # the graph is cached too, and then the graph's solution
+            G = ms.to_graph(return_graph=True, contract=True)
+            self.assertIs(G, ms.to_graph(return_graph=True, contract=True))
+            solution = ms.solve_graph(print_solution=False,
+                                      return_solution=True)
+            self.assertEqual(len(os.listdir(directory)), 3)
+            self.assertEqual(solution.count(BLAZE),
+                             correct_solution.count(BLAZE))
+            # the least recently used files go first
+            ms.cache.max_disk_bytes = os.path.getsize(
+                ms.cache._filename(next(reversed(ms.cache._memory))))
+            ms.cache.put('0' * 40, None)
+            self.assertEqual(os.listdir(directory), ['0' * 40 + '.pickle'])
+            self.assertIsNone(ms.cache.get('0' * 40, 'missed'))
+            ms.cache.clear()
+            self.assertEqual(os.listdir(directory), [])
+            # a failed write leaves nothing behind
+            with self.assertRaises(Exception):
+                ms.cache.put('1' * 40, lambda: None)
+            self.assertEqual(os.listdir(directory), [])
+            self.assertEqual(ms.cache.get('0' * 40, 'missed'), 'missed')
+
+        # a maze changed in place does not get its old solution
+        self.ms.cache = SolutionCache()
+        solution = self.ms.solve_grid(print_solution=False,
+                                      return_solution=True)
+        row, col = divmod(solution.find(BLAZE)[0], solution.cols)
+        self.ms.insert_char(self.ms.original_maze, row, col, self.ms.wall)
+        with redirect_stdout(io.StringIO()):
+            self.assertNotEqual(
+                self.ms.solve_grid(print_solution=False,
+                                   return_solution=True), solution)
+
+    def test_stats(self):
+        """Stats record each phase and attempt, in workers too."""
+
+        self.ms.get_maze("test_mazes/test_maze_105.txt")
+        self.ms.verify_maze()
+        with redirect_stdout(io.StringIO()):
+            self.ms.solve_maze(n=3, seed=1, trace='summary')
+        self.assertIsNone(self.ms.stats)
+        self.ms.stats = SolverStats()
+        with redirect_stdout(io.StringIO()):
+            self.ms.solve_maze(n=3, seed=1, trace='summary')
+        stats = self.ms.stats.to_dict()
+        json.dumps(stats)
+        counters = stats['counters']
+        self.assertEqual(len(stats['attempts']), 3)
+        self.assertEqual(counters['forays'],
+                         sum(len(steps[1]) for steps in self.ms.steps))
+        self.assertEqual(counters['steps'],
+                         sum(sum(foray[1] for foray in steps[1])
+                             for steps in self.ms.steps))
+        self.assertEqual(counters['path_lookups'], counters['steps'])
+        self.assertEqual(counters['fill_passes'],
+                         3 + counters['loops_broken'])
+        for counter in counters:
+            self.assertEqual(counters[counter],
+                             sum(attempt[counter]
+                                 for attempt in stats['attempts']))
+        self.assertGreater(counters['cells_filled'], 0)
+        self.assertTrue(all(seconds > 0
+                            for seconds in stats['timers'].values()))
+        # the same attempts made in worker processes count the same
+        ms = MazeSolver()
+        ms.get_maze("test_mazes/test_maze_105.txt")
+        ms.verify_maze()
+        ms.stats = SolverStats()
+        with redirect_stdout(io.StringIO()):
+            ms.solve_maze(n=3, seed=1, trace='summary', workers=2)
+        self.assertEqual(ms.stats.counters, self.ms.stats.counters)
+        self.ms.stats.clear()
+        self.assertEqual(self.ms.stats.to_dict()['attempts'], [])
+
+    def test_batch(self):
+        """The batch command reports every maze, even ones that fail."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            for number in ('001', '004', '007', '100'):
+                shutil.copy("test_mazes/test_maze_{}.txt".format(number),
+                            directory)
+            # the start and destination are walled apart
+            with open(os.path.join(directory, 'walled_apart.txt'), 'w') as f:
+                f.write('00000\n0S0D0\n01010\n01010\n00000\n')
+            printed = {}
+            status = {}
+            for method in ('grid', 'bidirectional', 'graph'):
+                printed[method] = io.StringIO()
+                with redirect_stdout(printed[method]):
+                    status[method] = main(['batch', directory, '--workers',
+                                           '2', '--method', method])
+        for method in printed:
+            lines = printed[method].getvalue().splitlines()
+            results = {os.path.basename(result['file']): result
+                       for result in map(json.loads, lines)}
+            self.assertEqual(status[method], 1)
+            self.assertEqual(
+                {name: (result['status'], result['length'])
+                 for name, result in results.items()},
+                {'test_maze_001.txt': ('solved', 5),
+                 'test_maze_004.txt': ('solved', 5),
+                 'walled_apart.txt': ('no path', None),
+                 'test_maze_007.txt': ('invalid', None),
+                 'test_maze_100.txt': ('solved', 61)})
+            self.assertIn('start and a destination',
+                          results['test_maze_007.txt']['error'])
+            self.assertEqual(set(results['test_maze_001.txt']['timings']),
+                             {'load', 'verify', 'solve'})
+
+    def test_batch_worker_crash(self):
+        """Only the file that kills a worker fails; the rest are solved."""
+
+        names = ['crash.txt'] + ['test_maze_{}.txt'.format(number)
+                                 for number in range(5)]
+        for workers in ('1', '3'):
+            with tempfile.TemporaryDirectory() as directory:
+                for name in names:
+                    shutil.copy("test_mazes/test_maze_001.txt",
+                                os.path.join(directory, name))
+                printed = io.StringIO()
+                with mock.patch('MazeSolver._solve_file',
+                                _crashing_solve_file), \
+                        redirect_stdout(printed):
+                    status = main(['batch', directory, '--workers', workers])
+            results = {os.path.basename(result['file']): result for result in
+                       map(json.loads, printed.getvalue().splitlines())}
+            self.assertEqual(status, 1)
+            self.assertEqual(set(results), set(names))
+            self.assertEqual(results.pop('crash.txt')['status'], 'error')
+            self.assertEqual({result['status']
+                              for result in results.values()}, {'solved'})
+
+    def test_batch_broken_pipe(self):
+        """A reader that stops early ends the batch without a traceback."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            for number in range(20):
+                shutil.copy("test_mazes/test_maze_001.txt",
+                            os.path.join(directory,
+                                         'maze_{}.txt'.format(number)))
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'MazeSolver', 'batch', directory,
+                 '--workers', '1'],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            process.stdout.readline()
+            process.stdout.close()
+            stderr = process.stderr.read()
+            process.stderr.close()
+            process.wait()
+        self.assertEqual(stderr, b'')
+
+    def test_benchmarks(self):
+        """The benchmark mazes are solvable and regressions are caught."""
+
+        for topology, generate in MazeSolver_benchmarks.GENERATORS.items():
+            for size in (10, 31):
+                with tempfile.NamedTemporaryFile('w', suffix='.txt',
+                                                 delete=False) as f:
+                    f.write('\n'.join(generate(size, random.Random(size))))
+                try:
+                    self.ms.get_maze(f.name)
+                finally:
+                    os.remove(f.name)
+                self.assertIsNotNone(self.ms.verify_maze(return_maze=True))
+                self.assertIsNotNone(self.ms._optimal_length())
+        results = MazeSolver_benchmarks.run(sizes=[10], repeat=1,
+                                            log=io.StringIO())
+        # one result for every benchmark that runs on each topology at 10
+        self.assertEqual(len(results), len([
+            (topology, name)
+            for topology in MazeSolver_benchmarks.TOPOLOGIES
+            for name, (_, largest, layouts)
+            in MazeSolver_benchmarks.BENCHMARKS.items()
+            if (largest is None or largest >= 10) and
+            (layouts is None or topology in layouts)]))
+        slower = [dict(result, seconds=result['seconds'] * 2 + 0.01)
+                  for result in results]
+        self.assertEqual(MazeSolver_benchmarks.compare(results, results), [])
+        self.assertEqual(len(MazeSolver_benchmarks.compare(slower, results)),
+                         len(results))
+
+    def test_maze_generator(self):
+        """Generated mazes are solvable, reproducible and stream to disk."""
+
+        for algorithm in ('backtracker', 'kruskal', 'eller'):
+            # a perfect maze is a tree: one fewer passage than tiles
+            maze = MazeGenerator(algorithm, seed=1).grid(21, 30)
+            self.assertEqual((maze.rows, maze.cols), (21, 30))
+            self.assertEqual(maze.cells[-maze.cols:], bytes([WALL]) * 30)
+            tiles = maze.mask([PATH, START, DEST])
+            passages = sum(bin(tiles & tiles >> step).count('1')
+                           for step in (1, maze.cols))
+            self.assertEqual(passages, len(maze.cells) - maze.count(WALL) - 1)
+            self.ms.set_maze(maze)
+            self.assertIsNotNone(self.ms.verify_maze(return_maze=True))
+            self.assertEqual((self.ms.S_row, self.ms.S_col), (1, 1))
+            self.assertEqual((self.ms.D_row, self.ms.D_col), (19, 27))
+            self.assertIsNotNone(self.ms._optimal_length())
+            # braiding leaves no dead-ends
+            braided = MazeGenerator(algorithm, braid=1.0, seed=1).grid(21, 31)
+            self.assertEqual(self.ms.count_dead_ends(braided), 0)
+            # the same seed makes the same maze, in a file too
+            generator = MazeGenerator(algorithm, braid=0.5, rooms=0.3, seed=2)
+            self.assertEqual(
+                list(generator.lines(41, 41)),
+                list(MazeGenerator(algorithm, braid=0.5, rooms=0.3,
+                                   seed=2).lines(41, 41)))
+            with tempfile.TemporaryDirectory() as directory:
+                filename = os.path.join(directory, 'maze.txt')
+                MazeGenerator(algorithm, braid=0.5, rooms=0.3,
+                              seed=2).write(filename, 41, 41)
+                self.ms.get_maze(filename)
+            self.assertEqual(self.ms.original_maze.cells,
+                             MazeGenerator(algorithm, braid=0.5, rooms=0.3,
+                                           seed=2).grid(41, 41).cells)
+            self.assertIsNotNone(self.ms._optimal_length())
+        with self.assertRaises(ValueError):
+            MazeGenerator().grid(3, 3)
+
+    def test_query(self):
+        """Finds shortest paths between any tiles, reusing search trees."""
+
+        filename = "test_mazes/test_maze_105.txt"
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        self.ms.to_graph()
+        S = (self.ms.S_row, self.ms.S_col)
+        D = (self.ms.D_row, self.ms.D_col)
+        tiles = list(self.ms.G.nodes)
+        pairs = [(src, dst) for src in (S, D, tiles[5]) for dst in tiles]
+        for src, dst in pairs:
+            path = self.ms.query(src, dst)
+            self.assertEqual((path[0], path[-1]), (src, dst))
+            self.assertEqual(len(path),
+                             len(nx.shortest_path(self.ms.G, src, dst)))
+        self.assertEqual(list(self.ms._trees), [self.ms.original_maze.index(
+            *src) for src in (S, D, tiles[5])])
+        self.assertEqual([self.ms.query(src, dst) for src, dst in pairs],
+                         self.ms.query_many(pairs))
+        # walls and tiles cut off have no path
+        self.assertIsNone(self.ms.query(S, (0, 0)))
+        with self.assertRaises(IndexError):
+            self.ms.query(S, (-1, 0))
+
+        # the same maze loaded again keeps its trees
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        self.ms.query(S, D)
+        self.assertEqual(len(self.ms._trees), 3)
+
+        # a different maze empties the cache; then make room for one tree
+        # only
+        tree = self.ms._trees[self.ms.original_maze.index(*S)]
+        self.ms.query_cache_bytes = tree.itemsize * len(tree)
+        self.ms.get_maze("test_mazes/test_maze_100.txt")
+        self.ms.verify_maze()
+        self.ms.query((self.ms.S_row, self.ms.S_col),
+                      (self.ms.D_row, self.ms.D_col))
+        self.ms.get_maze(filename)
+        self.ms.verify_maze()
+        self.ms.query_many(pairs)
+        self.assertEqual(list(self.ms._trees),
+                         [self.ms.original_maze.index(*tiles[5])])
+
+        # so does a maze changed in place
+        maze = Grid.from_strings([self.wall*5,
+                                  self.wall + self.start + self.path*2 +
+                                  self.wall,
+                                  self.wall + self.path + self.wall +
+                                  self.path + self.wall,
+                                  self.wall + self.path*2 + self.dest +
+                                  self.wall,
+                                  self.wall*5])
+        self.ms.set_maze(maze)
+        self.assertEqual(len(self.ms.query((1, 1), (3, 3))), 5)
+        maze.set(1, 2, WALL)
+        maze.set(2, 1, WALL)
+        self.assertIsNone(self.ms.query((1, 1), (3, 3)))
+
+    def test_nearest(self):
+        """Finds the nearest of several destinations in one search."""
+
+        filename = "test_mazes/test_maze_108.txt"
+        self.ms.get_maze(filename)
+        with redirect_stdout(io.StringIO()):
+            self.assertIsNone(self.ms.verify_maze())
+        self.ms.verify_maze(multiple=True)
+        starts = [(3, 1), (14, 8)]
+        dests = [(11, 27), (16, 17)]
+        self.assertEqual((self.ms.S_row, self.ms.S_col), starts[0])
+        test_path = self.ms.nearest()
+        correct_path = min((self.ms.query(src, dst) for src in starts
+                            for dst in dests), key=len)
+        self.assertEqual(len(correct_path), len(test_path))
+        self.assertIn(test_path[0], starts)
+        self.assertIn(test_path[-1], dests)
+        # any tiles will do
+        self.assertEqual(self.ms.nearest([(14, 8)], [(16, 17)]),
+                         self.ms.query((14, 8), (16, 17)))
+        self.assertEqual(self.ms.nearest([(3, 1)], [(3, 1)]), [(3, 1)])
+        self.assertIsNone(self.ms.nearest([(3, 1)], [(0, 0)]))
+
 if __name__ == '__main__':
     unittest.main()
 